@@ -0,0 +1,15 @@
+from fastapi.security import OAuth2PasswordBearer
+from app.core.security import Authentication
+from app.database.session import SessionLocal
+
+# Shared dependencies for all route modules
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+authenticator = Authentication()
+
+def get_db():
+    """Yield a pooled database session for the duration of a request"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
\ No newline at end of file
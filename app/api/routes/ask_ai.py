@@ -1,57 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from fastapi.security import OAuth2PasswordBearer
-from app.database.models import AIResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.database.models import AIResponse, AskAIRequest
 import app.config as config
 from app.core.ai_client import AIClient
-from app.core.security import Authentication
+from app.api.routes.food_log import get_rag_service
+from app.core.security import cached_decode_token
+from sqlalchemy.orm import Session
+from app.api.deps import oauth2_scheme, get_db
+import asyncio
 import logging
+import orjson
+import weakref
+from functools import lru_cache
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-authenticator = Authentication()
 
 AI_CLIENT = config.SELECTED_AI_CLIENT
 AI_MODEL = config.SELECTED_AI_MODEL
 
 logger = logging.getLogger(__name__)
 
+# Per-conversation locks so concurrent requests from one user don't interleave history updates.
+# Weakly held, so a lock is dropped once no request is using or waiting on it.
+_conversation_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _get_conversation_lock(cache_key: str) -> asyncio.Lock:
+    """Get the lock for a conversation, creating it if no request currently holds one"""
+    lock = _conversation_locks.get(cache_key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _conversation_locks[cache_key] = lock
+    return lock
+
+@lru_cache(maxsize=1024)
+def get_ai_client(username: str, cache_key: str) -> AIClient:
+    """Get the AI client for a user, constructing it only once per user and cache key"""
+    return AIClient(
+        ai_client=AI_CLIENT,
+        ai_model=AI_MODEL,
+        user=username,
+        cache_key=cache_key,
+        rag_service=get_rag_service()
+    )
+
 @router.post("/askAI", response_model=AIResponse)
 async def ask_ai(
+    payload: AskAIRequest,
     token: str = Depends(oauth2_scheme),
-    body: dict = Body(...)
+    db: Session = Depends(get_db)
 ):
     """Ask AI assistant with RAG capabilities for food history queries"""
-    food_details = body.get("food_details")
-    user = authenticator.decode_token(token)
+    user = await run_in_threadpool(cached_decode_token, token, db)
     if not user:
         raise HTTPException(
             status_code=401,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if not food_details:
-        raise HTTPException(
-            status_code=400,
-            detail="Question is required"
-        )
+    # Return the pooled connection now rather than holding it through the upstream AI call
+    db.close()
     try:
-        ai_client = AIClient(
-            ai_client=AI_CLIENT,
-            ai_model=AI_MODEL,
-            user=user.username,
-            cache_key=config.USER_CACHE_KEY_MAP.get(user.username, user.username)
-        )
-        response = ai_client.get_ai_response(food_details)
+        ai_client = get_ai_client(user.username, user._cache_key)
+        async with _get_conversation_lock(user._cache_key):
+            response = await ai_client.get_ai_response(payload.food_details)
         if not response:
             raise HTTPException(
                 status_code=500,
                 detail="Failed to get AI response",
             )
-        logger.info(f"AI response generated for user {user.username}")
-        return AIResponse(response=str(response))
+        logger.info("AI response generated for user %s", user.username)
+        return AIResponse.model_construct(response=str(response))
     except Exception as e:
-        logger.error(f"Error in ask_ai for user {user.username}: {e}")
+        logger.error("Error in ask_ai for user %s: %s", user.username, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to get AI response"
-        )
\ No newline at end of file
+        )
+
+@router.post("/askAIStream")
+async def ask_ai_stream(
+    payload: AskAIRequest,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """Ask AI assistant and stream the response as Server-Sent Events"""
+    user = await run_in_threadpool(cached_decode_token, token, db)
+    if not user:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # Return the pooled connection now rather than holding it through the upstream AI call
+    db.close()
+    ai_client = get_ai_client(user.username, user._cache_key)
+
+    async def event_stream():
+        # Each chunk is JSON-encoded so newlines in the text can't break the SSE framing
+        async with _get_conversation_lock(user._cache_key):
+            try:
+                async for text in ai_client.stream_ai_response(payload.food_details):
+                    yield b"data: " + orjson.dumps({"text": text}) + b"\n\n"
+            except Exception as e:
+                logger.error("Error in ask_ai_stream for user %s: %s", user.username, e)
+                yield b"data: " + orjson.dumps({"error": "Failed to get AI response"}) + b"\n\n"
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
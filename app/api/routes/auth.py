@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from app.core.security import Authentication
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.api.deps import authenticator, get_db
 from app.database.models import UserCreate, UserInDB, Token
-from app.database.session import SessionLocal
 from app.database.models import UserTable
 import logging
 
@@ -13,10 +15,6 @@ logger = logging.getLogger(__name__)
 # Router setup
 router = APIRouter()
 
-# Security setup
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-authenticator = Authentication()
-
 # Pydantic models for responses
 class UserResponse(BaseModel):
     username: str
@@ -34,12 +32,21 @@ class ProfileData(BaseModel):
     height: int = None
     activityLevel: str = "moderately_active"
 
+def find_existing_user(username: str, email: str, db: Session):
+    """Find a user that already holds the given username or email"""
+    return db.query(UserTable).filter(
+        or_(UserTable.username == username, UserTable.email == email)
+    ).first()
+
 # Authentication endpoints
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
     """Login endpoint that returns JWT token"""
     try:
-        access_token = authenticator.authenticate_user(form_data.username, form_data.password)
+        access_token = await run_in_threadpool(authenticator.authenticate_user, form_data.username, form_data.password, db)
         if not access_token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,11 +54,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.info(f"User {form_data.username} logged in successfully")
+        logger.info("User %s logged in successfully", form_data.username)
         return {"access_token": access_token, "token_type": "bearer"}
     
     except Exception as e:
-        logger.error(f"Login error for user {form_data.username}: {e}")
+        logger.error("Login error for user %s: %s", form_data.username, e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed",
@@ -59,42 +66,36 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
 
 @router.post("/signup")
-async def signup(user_data: UserCreate):
+async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     """User registration endpoint"""
     try:
-        # Check if user already exists
-        if authenticator._user_exists(user_data.username):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
-            )
-        
-        # Check if email already exists
-        db = SessionLocal()
-        existing_email = db.query(UserTable).filter(UserTable.email == user_data.email).first()
-        db.close()
-        
-        if existing_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
-        # Create new user
-        new_user = authenticator.user_signup(user_data)
+        # Create new user; the insert is skipped if the username or email is taken
+        new_user = await run_in_threadpool(authenticator.user_signup, user_data, db)
         if not new_user:
+            # Only look up the conflicting row to report which field clashed
+            existing = await run_in_threadpool(find_existing_user, user_data.username, user_data.email, db)
+            if existing and existing.username == user_data.username:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Username already registered"
+                )
+            if existing:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create user"
             )
         
-        logger.info(f"New user registered: {user_data.username}")
+        logger.info("New user registered: %s", user_data.username)
         return {"message": "User created successfully"}
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Signup error for user {user_data.username}: {e}")
+        logger.error("Signup error for user %s: %s", user_data.username, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user"
@@ -1,35 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from fastapi.security import OAuth2PasswordBearer
-from app.core.security import Authentication
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from app.core.security import cached_decode_token
+from sqlalchemy.orm import Session
+from app.api.deps import oauth2_scheme, get_db
 from app.services.food_processor import FoodProcessor
+from app.services.rag_service import RAGService
 from app.core.vector_store import LocalVectorStore
 from app.database.schemas import FoodEntryResponse
 from datetime import date, datetime
+from typing import Optional
+from cachetools import TTLCache
+import hashlib
+import orjson
 import logging
 import asyncio
+import threading
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-authenticator = Authentication()
 
 # Initialize services
 food_processor = None
+rag_service = None
 vector_store = None
+_services_lock = threading.Lock()
 
 def get_food_processor():
     global food_processor
     if food_processor is None:
-        food_processor = FoodProcessor()
+        # Resolved before taking the lock, which get_vector_store also takes
+        store = get_vector_store()
+        with _services_lock:
+            if food_processor is None:
+                food_processor = FoodProcessor(vector_store=store)
     return food_processor
 
+def get_rag_service():
+    global rag_service
+    if rag_service is None:
+        # Resolved before taking the lock, which get_vector_store also takes
+        store = get_vector_store()
+        with _services_lock:
+            if rag_service is None:
+                rag_service = RAGService(vector_store=store)
+    return rag_service
+
 def get_vector_store():
     global vector_store
     if vector_store is None:
-        vector_store = LocalVectorStore()
+        with _services_lock:
+            if vector_store is None:
+                vector_store = LocalVectorStore()
     return vector_store
 
+def init_services():
+    """Eagerly create the food log services so the first requests don't race to build them"""
+    get_food_processor()
+    get_rag_service()
+    get_vector_store()
+
+async def close_services():
+    """Release the connections held by the food log services"""
+    if vector_store is not None:
+        await vector_store.aclose()
+
 logger = logging.getLogger(__name__)
 
+# Recently read days, (username, date) -> (entries, etag). The cache is per worker process and
+# only this worker's writes invalidate it, so other workers can serve a day's entries and ETag up
+# to ENTRIES_CACHE_TTL seconds stale; the TTL is kept short so that window stays small.
+ENTRIES_CACHE_TTL = 5
+_entries_cache = TTLCache(maxsize=1024, ttl=ENTRIES_CACHE_TTL)
+_entries_cache_lock = threading.Lock()
+ENTRIES_CACHE_CONTROL = "private, no-cache"
+
+def get_cached_entries(username: str, target_date: date):
+    """Get a day's food entries and their ETag, reusing recent reads"""
+    key = (username, target_date)
+    with _entries_cache_lock:
+        cached = _entries_cache.get(key)
+    if cached is not None:
+        return cached
+
+    entries = get_vector_store().get_food_entries_by_date_range(
+        username=username,
+        start_date=target_date,
+        end_date=target_date
+    )
+    # The date is part of every response body, so two days with the same entries must not share an ETag
+    digest = hashlib.blake2b(orjson.dumps((target_date.isoformat(), entries)), digest_size=16).hexdigest()
+    etag = '"' + digest + '"'
+    with _entries_cache_lock:
+        _entries_cache[key] = (entries, etag)
+    return entries, etag
+
+def invalidate_cached_entries(username: str, entry_date: Optional[date] = None):
+    """Drop cached entries for one day of a user, or for all their days if no date is given"""
+    with _entries_cache_lock:
+        if entry_date is not None:
+            _entries_cache.pop((username, entry_date), None)
+            return
+        for key in [key for key in _entries_cache.keys() if key[0] == username]:
+            _entries_cache.pop(key, None)
+
 def store_in_vector_background(username: str, structured_food_data: dict, entry_date: date):
     """Background task to store food entry in vector store"""
     try:
@@ -39,9 +112,12 @@ def store_in_vector_background(username: str, structured_food_data: dict, entry_
             food_data=structured_food_data,
             entry_date=entry_date
         )
-        logger.info(f"Background vector storage completed for user {username}: {entry_id}")
+        logger.info("Background vector storage completed for user %s: %s", username, entry_id)
     except Exception as e:
-        logger.error(f"Background vector storage failed for user {username}: {e}")
+        logger.error("Background vector storage failed for user %s: %s", username, e)
+    finally:
+        # The food log may have been written even if a later step failed
+        invalidate_cached_entries(username, entry_date)
 
 def delete_from_vector_background(username: str, entry_id: str):
     """Background task to delete food entry from vector store and JSON"""
@@ -53,28 +129,34 @@ def delete_from_vector_background(username: str, entry_id: str):
             entry_id=entry_id
         )
         if success:
-            logger.info(f"Background deletion completed for user {username}: {entry_id}")
+            logger.info("Background deletion completed for user %s: %s", username, entry_id)
         else:
-            logger.warning(f"Entry not found for deletion: {username} - {entry_id}")
+            logger.warning("Entry not found for deletion: %s - %s", username, entry_id)
     except Exception as e:
-        logger.error(f"Background deletion failed for user {username}: {e}")
+        logger.error("Background deletion failed for user %s: %s", username, e)
+    finally:
+        # The food log may have been rewritten even if a later step failed
+        invalidate_cached_entries(username)
 
 @router.post("/logFoodText", response_model=FoodEntryResponse)
 async def log_food_text(
     background_tasks: BackgroundTasks,
     food_details: str = Query(None, description="Natural language food description"),
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
     """Log food entry with immediate response and background vector storage"""
     
     # Authenticate user
-    user = authenticator.decode_token(token)
+    user = await run_in_threadpool(cached_decode_token, token, db, verify_user=True)
     if not user:
         raise HTTPException(
             status_code=401,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Return the pooled connection now rather than holding it through the food processing call
+    db.close()
     
     # Validate input
     if not food_details or not food_details.strip():
@@ -87,30 +169,32 @@ async def log_food_text(
         # Initialize services
         processor = get_food_processor()
         
-        logger.info(f"Processing food entry for user {user.username}: {food_details}")
+        logger.info("Processing food entry for user %s: %s", user.username, food_details)
         
         # Process natural language food description into structured data
-        structured_food_data = processor.process_food_description(food_details.strip())
+        structured_food_data = await processor.process_food_description(food_details.strip())
         
-        logger.info(f"Food processing result: {structured_food_data}")
+        logger.info("Food processing result: %s", structured_food_data)
         
         # Generate entry_id immediately
-        entry_id = f"{user.username}_{date.today().strftime('%Y%m%d')}_{datetime.now().strftime('%H%M%S')}"
+        now = datetime.now()
+        today = now.date()
+        entry_id = f"{user.username}_{now.year:04d}{now.month:02d}{now.day:02d}_{now.hour:02d}{now.minute:02d}{now.second:02d}"
         structured_food_data['entry_id'] = entry_id
-        structured_food_data['timestamp'] = datetime.now().isoformat()
+        structured_food_data['timestamp'] = now.isoformat()
         
         # Add vector storage as background task (non-blocking)
         background_tasks.add_task(
             store_in_vector_background,
             user.username,
             structured_food_data.copy(),
-            date.today()
+            today
         )
         
-        logger.info(f"Returning immediate response for user {user.username}: {structured_food_data.get('food_name', 'Unknown')}")
+        logger.info("Returning immediate response for user %s: %s", user.username, structured_food_data.get('food_name', 'Unknown'))
         
         # Return structured data immediately (before vector storage completes)
-        return FoodEntryResponse(
+        return FoodEntryResponse.model_construct(
             entry_id=entry_id,
             food_name=structured_food_data.get('food_name', 'Unknown Food'),
             quantity=structured_food_data.get('quantity', 'Unknown'),
@@ -121,12 +205,12 @@ async def log_food_text(
             fiber=float(structured_food_data.get('fiber', 0)),
             food_review=structured_food_data.get('food_review', ''),
             meal_type=structured_food_data.get('meal_type', 'unknown'),
-            timestamp=structured_food_data.get('timestamp', datetime.now().isoformat()),
-            date=date.today()
+            timestamp=structured_food_data['timestamp'],
+            date=today
         )
         
     except Exception as e:
-        logger.error(f"Error logging food for user {user.username}: {str(e)}", exc_info=True)
+        logger.error("Error logging food for user %s: %s", user.username, e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to log food entry: {str(e)}"
@@ -137,11 +221,12 @@ async def log_food_text(
 async def delete_food_entry(
     entry_id: str,
     background_tasks: BackgroundTasks,
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
     """Delete a food entry from both JSON storage and vector store"""
     
-    user = authenticator.decode_token(token)
+    user = await run_in_threadpool(cached_decode_token, token, db, verify_user=True)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -150,14 +235,6 @@ async def delete_food_entry(
         )
     
     try:
-        # Extract date from entry_id (format: username_YYYYMMDD_HHMMSS)
-        parts = entry_id.split('_')
-        if len(parts) >= 3:
-            date_str = parts[1]  # YYYYMMDD
-            entry_date = datetime.strptime(date_str, '%Y%m%d').date()
-        else:
-            entry_date = date.today()  # Fallback to today
-        
         # Add deletion as background task
         background_tasks.add_task(
             delete_from_vector_background,
@@ -165,12 +242,12 @@ async def delete_food_entry(
             entry_id
         )
         
-        logger.info(f"Deletion queued for user {user.username}: {entry_id}")
+        logger.info("Deletion queued for user %s: %s", user.username, entry_id)
         
         return {"message": f"Food entry {entry_id} deletion queued successfully"}
         
     except Exception as e:
-        logger.error(f"Error deleting food entry for user {user.username}: {str(e)}")
+        logger.error("Error deleting food entry for user %s: %s", user.username, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to delete food entry"
@@ -179,12 +256,14 @@ async def delete_food_entry(
 
 @router.get("/getFoodEntries")
 async def get_food_entries(
+    request: Request,
     date_str: str = Query(None, description="Date in YYYY-MM-DD format"),
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
     """Get all food entries for a specific date"""
     
-    user = authenticator.decode_token(token)
+    user = await run_in_threadpool(cached_decode_token, token, db)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -198,14 +277,18 @@ async def get_food_entries(
         else:
             target_date = date.today()
         
-        store = get_vector_store()
-        entries = store.get_food_entries_by_date_range(
-            username=user.username,
-            start_date=target_date,
-            end_date=target_date
-        )
+        entries, etag = await run_in_threadpool(get_cached_entries, user.username, target_date)
+        if request.headers.get("if-none-match") == etag:
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": ENTRIES_CACHE_CONTROL}
+            )
         
-        return {"entries": entries, "date": target_date.isoformat()}
+        # Returned as a response so the entries go straight to orjson instead of through jsonable_encoder
+        return ORJSONResponse(
+            {"entries": entries, "date": target_date},
+            headers={"ETag": etag, "Cache-Control": ENTRIES_CACHE_CONTROL}
+        )
         
     except ValueError:
         raise HTTPException(
@@ -213,7 +296,7 @@ async def get_food_entries(
             detail="Invalid date format. Use YYYY-MM-DD"
         )
     except Exception as e:
-        logger.error(f"Error getting food entries for user {user.username}: {str(e)}")
+        logger.error("Error getting food entries for user %s: %s", user.username, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to get food entries"
@@ -222,12 +305,14 @@ async def get_food_entries(
 
 @router.get("/getDailySummary")
 async def get_daily_summary(
+    request: Request,
     date_str: str = Query(None, description="Date in YYYY-MM-DD format"),
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
     """Get daily nutrition summary"""
     
-    user = authenticator.decode_token(token)
+    user = await run_in_threadpool(cached_decode_token, token, db)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -241,30 +326,35 @@ async def get_daily_summary(
         else:
             target_date = date.today()
         
-        store = get_vector_store()
-        entries = store.get_food_entries_by_date_range(
-            username=user.username,
-            start_date=target_date,
-            end_date=target_date
-        )
+        entries, etag = await run_in_threadpool(get_cached_entries, user.username, target_date)
+        if request.headers.get("if-none-match") == etag:
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": ENTRIES_CACHE_CONTROL}
+            )
         
-        # Calculate totals
-        total_calories = sum(entry.get('calories', 0) for entry in entries)
-        total_protein = sum(entry.get('protein', 0) for entry in entries)
-        total_carbs = sum(entry.get('carbs', 0) for entry in entries)
-        total_fats = sum(entry.get('fats', 0) for entry in entries)
-        total_fiber = sum(entry.get('fiber', 0) for entry in entries)
+        # Calculate totals in a single pass over the entries
+        total_calories = total_protein = total_carbs = total_fats = total_fiber = 0
+        for entry in entries:
+            total_calories += entry.get('calories', 0)
+            total_protein += entry.get('protein', 0)
+            total_carbs += entry.get('carbs', 0)
+            total_fats += entry.get('fats', 0)
+            total_fiber += entry.get('fiber', 0)
         
-        return {
-            "date": target_date.isoformat(),
-            "total_calories": total_calories,
-            "total_protein": total_protein,
-            "total_carbs": total_carbs,
-            "total_fats": total_fats,
-            "total_fiber": total_fiber,
-            "entries_count": len(entries),
-            "entries": entries
-        }
+        return ORJSONResponse(
+            {
+                "date": target_date,
+                "total_calories": total_calories,
+                "total_protein": total_protein,
+                "total_carbs": total_carbs,
+                "total_fats": total_fats,
+                "total_fiber": total_fiber,
+                "entries_count": len(entries),
+                "entries": entries
+            },
+            headers={"ETag": etag, "Cache-Control": ENTRIES_CACHE_CONTROL}
+        )
         
     except ValueError:
         raise HTTPException(
@@ -272,7 +362,7 @@ async def get_daily_summary(
             detail="Invalid date format. Use YYYY-MM-DD"
         )
     except Exception as e:
-        logger.error(f"Error getting daily summary for user {user.username}: {str(e)}")
+        logger.error("Error getting daily summary for user %s: %s", user.username, e)
         raise HTTPException(
             status_code=500,
             detail="Failed to get daily summary"
@@ -1,21 +1,99 @@
 # Add this health router to your app/main.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import text  # Add this import
-from app.database.session import SessionLocal
+from sqlalchemy.orm import Session
+from app.api.deps import oauth2_scheme, get_db
+from app.core.security import cached_decode_token
 from app.settings import settings
+from app.services.food_processor import get_result_cache_stats
+import asyncio
 import logging
 import time
 import os
 import psutil
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
 
 # Create health router
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+CPU_SAMPLE_INTERVAL = 5.0
+USER_COUNT_TTL = 60.0
+STORAGE_CHECK_INTERVAL = 10.0
+DATA_DIR = "./data"
+_PROC = psutil.Process(os.getpid())
+
+@dataclass
+class _SystemMetricsCache:
+    """System metrics memoized for ttl seconds so frequent health probes don't re-read them"""
+    ttl: float = 5.0
+    cpu_percent: float = 0.0
+    memory: Any = None
+    disk: Any = None
+    process: Any = None
+    fetched_at: float = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self.memory is None or now - self.fetched_at > self.ttl:
+            self.memory = psutil.virtual_memory()
+            self.disk = psutil.disk_usage('/')
+            # oneshot() reads the process stat files once for all of the values below
+            with _PROC.oneshot():
+                self.process = {
+                    "rss": _PROC.memory_info().rss,
+                    "cpu_percent": _PROC.cpu_percent(interval=None),
+                    "num_threads": _PROC.num_threads(),
+                }
+            self.fetched_at = now
+        return self.memory, self.disk, self.cpu_percent, self.process
+
+_system_metrics = _SystemMetricsCache()
+
+# Cached (user_count, fetched_at) so the users table is scanned at most once per USER_COUNT_TTL
+_user_count_cache = (0, 0.0)
+
+# Cached (accessible, checked_at) so the data directory is probed at most once per STORAGE_CHECK_INTERVAL
+_storage_cache = (False, 0.0)
+
+def _storage_accessible() -> bool:
+    """Whether the data directory exists and is writable"""
+    global _storage_cache
+    accessible, checked_at = _storage_cache
+    now = time.monotonic()
+    if checked_at == 0.0 or now - checked_at > STORAGE_CHECK_INTERVAL:
+        accessible = os.path.isdir(DATA_DIR) and os.access(DATA_DIR, os.W_OK)
+        _storage_cache = (accessible, now)
+    return accessible
+
+# Cached (second, iso_string) so the timestamp is formatted at most once per second
+_timestamp_cache = (0, "")
+
+def _utc_timestamp() -> str:
+    """Current UTC time as an ISO 8601 string with second resolution"""
+    global _timestamp_cache
+    second = int(time.time())
+    if _timestamp_cache[0] != second:
+        _timestamp_cache = (second, datetime.fromtimestamp(second, timezone.utc).isoformat())
+    return _timestamp_cache[1]
+
+def count_users(db: Session) -> int:
+    """Count the rows in the users table"""
+    return db.execute(text("SELECT COUNT(*) as user_count FROM users")).scalar() or 0
+
+async def sample_cpu_percent():
+    """Background task that keeps the cached CPU usage up to date without blocking requests"""
+    psutil.cpu_percent(interval=None)  # Prime the counter; the first reading is meaningless
+    while True:
+        await asyncio.sleep(CPU_SAMPLE_INTERVAL)
+        _system_metrics.cpu_percent = psutil.cpu_percent(interval=None)
+
 @router.get("/health")
-async def health_check():
+async def health_check(db: Session = Depends(get_db)):
     """
     Health check endpoint for monitoring
     Returns system status and component health
@@ -24,7 +102,7 @@ async def health_check():
     
     health_status = {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": _utc_timestamp(),
         "version": "1.0.0",
         "components": {},
         "system": {}
@@ -32,9 +110,7 @@ async def health_check():
     
     # Check database connection
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))  # Fixed: Use text() function
-        db.close()
+        await run_in_threadpool(db.execute, text("SELECT 1"))  # Fixed: Use text() function
         health_status["components"]["database"] = {
             "status": "healthy",
             "message": "Database connection successful"
@@ -60,8 +136,7 @@ async def health_check():
         }
     
     # Check data directory
-    data_dir = "./data"
-    if os.path.exists(data_dir) and os.access(data_dir, os.W_OK):
+    if _storage_accessible():
         health_status["components"]["storage"] = {
             "status": "healthy",
             "message": "Data directory accessible"
@@ -75,9 +150,7 @@ async def health_check():
     
     # System metrics
     try:
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        cpu_percent = psutil.cpu_percent(interval=1)
+        memory, disk, cpu_percent, process = _system_metrics.get()
         
         health_status["system"] = {
             "memory": {
@@ -90,7 +163,8 @@ async def health_check():
                 "free": disk.free,
                 "percent": disk.percent
             },
-            "cpu_percent": cpu_percent
+            "cpu_percent": cpu_percent,
+            "process": process
         }
         
         # Warning thresholds
@@ -115,21 +189,21 @@ async def health_check():
 @router.get("/health/simple")
 async def simple_health_check():
     """Simple health check that just returns OK"""
-    return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "ok", "timestamp": _utc_timestamp()}
 
 @router.get("/health/database")
-async def database_health_check():
+async def database_health_check(db: Session = Depends(get_db)):
     """Specific database health check"""
     try:
-        db = SessionLocal()
-        result = db.execute(text("SELECT COUNT(*) as user_count FROM users")).fetchone()  # Fixed: Use text() function
-        db.close()
+        start = time.monotonic()
+        await run_in_threadpool(db.execute, text("SELECT 1"))
+        latency_ms = round((time.monotonic() - start) * 1000, 2)
         
         return {
             "status": "healthy",
             "database": "connected",
-            "user_count": result[0] if result else 0,
-            "timestamp": datetime.utcnow().isoformat()
+            "latency_ms": latency_ms,
+            "timestamp": _utc_timestamp()
         }
     except Exception as e:
         raise HTTPException(
@@ -138,6 +212,31 @@ async def database_health_check():
                 "status": "unhealthy",
                 "database": "disconnected",
                 "error": str(e),
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": _utc_timestamp()
             }
         )
+
+@router.get("/admin/stats")
+async def admin_stats(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Application statistics that are too expensive for the health probes, for admin users only"""
+    global _user_count_cache
+    user = await run_in_threadpool(cached_decode_token, token, db)
+    if not user:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if user.username not in settings.ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    user_count, fetched_at = _user_count_cache
+    if time.monotonic() - fetched_at > USER_COUNT_TTL:
+        user_count = await run_in_threadpool(count_users, db)
+        _user_count_cache = (user_count, time.monotonic())
+    
+    return {
+        "user_count": user_count,
+        "food_processing_cache": get_result_cache_stats(),
+        "timestamp": _utc_timestamp()
+    }
@@ -1,28 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.database.models import User, UserTable
-from app.core.security import Authentication
-from app.database.session import SessionLocal
+from app.api.deps import oauth2_scheme, authenticator, get_db
+from app.core.security import cached_decode_token, invalidate_cached_tokens
 import logging
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-authenticator = Authentication()
 
 logger = logging.getLogger(__name__)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/getProfile")
 def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Get user profile information, including preferences"""
-    user_data = authenticator.decode_token(token)
+    user_data = cached_decode_token(token, db)
     if not user_data:
         raise HTTPException(
             status_code=401,
@@ -32,17 +23,11 @@ def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends(get_d
     user = db.query(UserTable).filter(UserTable.username == user_data.username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    import json
-    # Try to load preferences from full_name if stored as JSON, else fallback
-    try:
-        preferences = json.loads(user.full_name) if user.full_name else {}
-    except Exception:
-        preferences = {}
     profile = {
         "username": user.username,
         "email": user.email,
         "disabled": user.disabled,
-        **preferences
+        **(user.preferences or {})
     }
     return profile
 
@@ -53,32 +38,40 @@ def update_profile(
     db: Session = Depends(get_db)
 ):
     """Update user profile information and preferences"""
-    user_data = authenticator.decode_token(token)
+    user_data = cached_decode_token(token, db)
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     user = db.query(UserTable).filter(UserTable.username == user_data.username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    import json
     # Update email if present
     if "email" in profile_data:
         user.email = profile_data["email"]
-    # Store all preferences as JSON in full_name (replace with dedicated column in production)
-    user.full_name = json.dumps(profile_data)
+    preferences = {key: value for key, value in profile_data.items() if key != "email"}
+    user.preferences = {**(user.preferences or {}), **preferences}
     db.commit()
     db.refresh(user)
-    logger.info(f"Profile updated for user: {user.username}")
+    logger.info("Profile updated for user: %s", user.username)
     return {"message": "Profile updated successfully"}
 
+def delete_user(username: str, db: Session) -> bool:
+    """Delete a user row, returning False if it did not exist"""
+    user_record = db.query(UserTable).filter(UserTable.username == username).first()
+    if not user_record:
+        return False
+    db.delete(user_record)
+    db.commit()
+    return True
 
 @router.delete("/deleteAccount")
 async def delete_account(
     password_data: dict,
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
 ):
     """Delete user account"""
     try:
-        current_user = authenticator.decode_token(token)
+        current_user = await run_in_threadpool(cached_decode_token, token, db)
         password = password_data.get("password")
         
         if not password:
@@ -88,25 +81,19 @@ async def delete_account(
             )
         
         # Authenticate password before deletion
-        if not authenticator.authenticate_user(current_user.username, password):
+        if not await run_in_threadpool(authenticator.authenticate_user, current_user.username, password, db):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect password"
             )
         
         # Delete user from database
-        db = SessionLocal()
-        user_record = db.query(UserTable).filter(UserTable.username == current_user.username).first()
-        
-        if user_record:
-            db.delete(user_record)
-            db.commit()
-            db.close()
+        if await run_in_threadpool(delete_user, current_user.username, db):
+            invalidate_cached_tokens(current_user.username)
             
-            logger.info(f"Account deleted for user: {current_user.username}")
+            logger.info("Account deleted for user: %s", current_user.username)
             return {"message": "Account deleted successfully"}
         else:
-            db.close()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
@@ -115,7 +102,7 @@ async def delete_account(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting account: {e}")
+        logger.error("Error deleting account: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete account"
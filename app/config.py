@@ -1,4 +1,5 @@
 import hashlib
+from cachetools import TTLCache
 AI_MODELS = {
     "claude": {
         "haiku": "claude-3-5-haiku-20241022",
@@ -20,6 +21,8 @@ AI_MODELS = {
 SELECTED_AI_CLIENT = "openai"
 SELECTED_AI_MODEL = "gpt-4o"
 SELECTED_AI_MODEL = AI_MODELS[SELECTED_AI_CLIENT][SELECTED_AI_MODEL]
-AI_GLOBAL_CACHE = {}
+# Conversations expire after an hour of inactivity and keep only their most recent messages
+AI_GLOBAL_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+AI_CONVERSATION_MAX_MESSAGES = 50
 USER_CACHE_KEY_MAP = {}
 FOOD_LOG = {}
\ No newline at end of file
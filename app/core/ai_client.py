@@ -1,73 +1,83 @@
 from fastapi import HTTPException
+import asyncio
 import logging
-from openai import OpenAI
+import re
+import httpx
+from openai import AsyncOpenAI
 from app.settings import settings
-from app.config import AI_GLOBAL_CACHE
+from collections import deque
+import threading
+from app.config import AI_GLOBAL_CACHE, AI_CONVERSATION_MAX_MESSAGES
 from app.services.rag_service import RAGService
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("AIClient")
 
+# AI_GLOBAL_CACHE is a TTLCache, which is not thread-safe on its own
+_CACHE_LOCK = threading.Lock()
+
+# One client for the whole process so upstream connections are kept alive across requests
+_OPENAI_CLIENT = AsyncOpenAI(
+    api_key=settings.OPEN_AI_API_KEY,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        timeout=httpx.Timeout(30.0),
+    ),
+)
+
+_FOOD_HISTORY_KEYWORDS = [
+    'what did i eat', 'what have i eaten', 'my food', 'food log',
+    'today', 'yesterday', 'this week', 'last week', 'this month',
+    'calories consumed', 'protein intake', 'carbs', 'nutrition summary',
+    'meal history', 'diet', 'food diary'
+]
+_FOOD_HISTORY_PATTERN = re.compile(
+    "|".join(re.escape(keyword) for keyword in _FOOD_HISTORY_KEYWORDS),
+    re.IGNORECASE,
+)
+
+_BASE_PROMPT = """You are a world-class nutritionist and personal food assistant. Your responses should be concise and focused on nutrition-related topics. You help users track their food intake, provide nutritional advice, and answer questions about their eating habits.
+
+Capabilities:
+- Answer questions about food, nutrition, and health
+- Suggest healthy food options and meal plans
+- Provide nutritional information and calorie estimates
+- Analyze eating patterns and provide personalized advice
+- Help users understand their food logs and dietary habits
+
+When users ask about their food intake or eating history, use the provided food log data to give accurate, personalized responses."""
+
+_CONTEXT_PROMPT_TEMPLATE = _BASE_PROMPT + """
+
+IMPORTANT: The user is asking about their food history. Here is their relevant food log data:
+
+{food_context}
+
+Use this information to provide accurate, specific answers about their eating habits, nutritional intake, and dietary patterns. Be conversational and helpful."""
+
+_LEGACY_PROMPT = """You are a world-class nutritionist. Your responses should be concise and focused
+on nutrition-related topics. You will answer questions about food, nutrition, and health.
+Suggest healthy food options, provide nutritional information, and give advice on maintaining a balanced diet."""
+
 class AIClient:
     """Enhanced AI client with RAG capabilities"""
 
-    def __init__(self, ai_client: str, ai_model: str, user: str, cache_key=None):
+    def __init__(self, ai_client: str, ai_model: str, user: str, cache_key=None, rag_service: RAGService = None):
         self.ai_client = ai_client
         self.ai_model = ai_model
         self.user = user
         self.cache = ConversationManager(user, cache_key=cache_key)
-        self.client = OpenAI(api_key=settings.OPEN_AI_API_KEY)
-        self.rag_service = RAGService()
+        self.client = _OPENAI_CLIENT
+        self.rag_service = rag_service or RAGService()
         
         if not self.ai_client or not self.ai_model:
             raise ValueError("AI client and model must be specified.")
 
-    def get_ai_response(self, query: str):
+    async def get_ai_response(self, query: str):
         """Get AI response with RAG capabilities"""
-        if not settings.OPEN_AI_API_KEY:
-            raise HTTPException(
-                status_code=500,
-                detail="OpenAI API key is not set in the environment variables.",
-            )
-
-        # Check if this is a food history query
-        food_context = ""
-        if self._is_food_history_query(query):
-            food_context = self.rag_service.query_food_history(self.user, query)
-            logger.info(f"Retrieved food context for user {self.user}: {len(food_context)} characters")
-
-        # Get conversation history and convert to OpenAI format
-        conversation_history = self.cache.get_conversation_history()
-        
-        # Convert messages to OpenAI format
-        openai_messages = []
-        
-        # Add system message
-        system_prompt = self._get_system_prompt_with_context(food_context)
-        openai_messages.append({"role": "system", "content": system_prompt})
-        
-        # Add conversation history
-        for message in conversation_history:
-            role = message["role"]
-            content = message["content"]
-            
-            # Handle content format - extract text from Anthropic format if needed
-            if isinstance(content, list) and len(content) > 0 and "text" in content[0]:
-                text_content = content[0]["text"]
-            elif isinstance(content, str):
-                text_content = content
-            else:
-                text_content = str(content)
-            
-            openai_messages.append({"role": role, "content": text_content})
-        
-        # Add current user message
-        openai_messages.append({"role": "user", "content": query})
-        
-        logger.info(f"Conversation history length: {len(openai_messages)}")
+        openai_messages = await self._build_messages(query)
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.ai_model,
                 messages=openai_messages,
                 max_tokens=1000,
@@ -76,63 +86,107 @@ class AIClient:
             
             ai_response = response.choices[0].message.content
             
-            # Cache the conversation in Anthropic format for compatibility
             self.cache.add_message(
                 messages=[
-                    {"role": "user", "content": [{"type": "text", "text": query}]},
-                    {"role": "assistant", "content": ai_response}
+                    {"role": "user", "content": query},
+                    {"role": "assistant", "content": ai_response or ""}
                 ]
             )
             
             return ai_response if ai_response else "No response from AI."
             
         except Exception as e:
-            logger.error(f"Error getting AI response: {e}")
+            logger.error("Error getting AI response: %s", e)
             raise HTTPException(status_code=500, detail="Failed to get AI response")
 
-    def _is_food_history_query(self, query: str) -> bool:
-        """Check if query is asking about food history"""
-        food_history_keywords = [
-            'what did i eat', 'what have i eaten', 'my food', 'food log',
-            'today', 'yesterday', 'this week', 'last week', 'this month',
-            'calories consumed', 'protein intake', 'carbs', 'nutrition summary',
-            'meal history', 'diet', 'food diary'
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in food_history_keywords)
+    async def stream_ai_response(self, query: str):
+        """Yield the AI response text as it is generated"""
+        openai_messages = await self._build_messages(query)
 
-    def _get_system_prompt_with_context(self, food_context: str = "") -> str:
-        """Get system prompt with optional food context"""
-        base_prompt = """You are a world-class nutritionist and personal food assistant. Your responses should be concise and focused on nutrition-related topics. You help users track their food intake, provide nutritional advice, and answer questions about their eating habits.
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.ai_model,
+                messages=openai_messages,
+                max_tokens=1000,
+                temperature=0.7,
+                stream=True
+            )
 
-Capabilities:
-- Answer questions about food, nutrition, and health
-- Suggest healthy food options and meal plans
-- Provide nutritional information and calorie estimates
-- Analyze eating patterns and provide personalized advice
-- Help users understand their food logs and dietary habits
+            chunks = []
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    chunks.append(text)
+                    yield text
 
-When users ask about their food intake or eating history, use the provided food log data to give accurate, personalized responses."""
+        except Exception as e:
+            logger.error("Error streaming AI response: %s", e)
+            raise HTTPException(status_code=500, detail="Failed to get AI response")
 
-        if food_context:
-            enhanced_prompt = f"""{base_prompt}
+        # Cache the turn once, after the whole response has arrived
+        self.cache.add_message(
+            messages=[
+                {"role": "user", "content": query},
+                {"role": "assistant", "content": "".join(chunks)}
+            ]
+        )
 
-IMPORTANT: The user is asking about their food history. Here is their relevant food log data:
+    async def _build_messages(self, query: str) -> list:
+        """Build the chat completion messages for a query, including food context when relevant"""
+        if not settings.OPEN_AI_API_KEY:
+            raise HTTPException(
+                status_code=500,
+                detail="OpenAI API key is not set in the environment variables.",
+            )
 
-{food_context}
+        # Start food history retrieval while the conversation is assembled
+        rag_task = None
+        if self._is_food_history_query(query):
+            rag_task = asyncio.create_task(self.rag_service.query_food_history(self.user, query))
 
-Use this information to provide accurate, specific answers about their eating habits, nutritional intake, and dietary patterns. Be conversational and helpful."""
-            return enhanced_prompt
-        
-        return base_prompt
+        # History is stored in OpenAI format already, so it is passed through as-is
+        conversation_history = self.cache.get_conversation_history()
+
+        food_context = ""
+        if rag_task is not None:
+            food_context = await rag_task
+            logger.info("Retrieved food context for user %s: %s characters", self.user, len(food_context))
+
+        system_prompt = self._get_system_prompt_with_context(food_context)
+        openai_messages = [
+            {"role": "system", "content": system_prompt},
+            *conversation_history,
+            {"role": "user", "content": query},
+        ]
+
+        logger.info("Conversation history length: %s", len(openai_messages))
+        return openai_messages
+
+    def _is_food_history_query(self, query: str) -> bool:
+        """Check if query is asking about food history"""
+        return _FOOD_HISTORY_PATTERN.search(query) is not None
+
+    def _get_system_prompt_with_context(self, food_context: str = "") -> str:
+        """Get system prompt with optional food context"""
+        if food_context:
+            return _CONTEXT_PROMPT_TEMPLATE.format(food_context=food_context)
+        return _BASE_PROMPT
 
     @staticmethod
     def _get_system_prompt():
         """Legacy method for compatibility"""
-        return """You are a world-class nutritionist. Your responses should be concise and focused
-on nutrition-related topics. You will answer questions about food, nutrition, and health.
-Suggest healthy food options, provide nutritional information, and give advice on maintaining a balanced diet."""
+        return _LEGACY_PROMPT
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Get the shared OpenAI client"""
+    return _OPENAI_CLIENT
+
+async def close_openai_client():
+    """Close the shared OpenAI client's connection pool"""
+    await _OPENAI_CLIENT.close()
 
 
 class ConversationManager:
@@ -145,25 +199,32 @@ class ConversationManager:
 
     def get_conversation_history(self) -> list:
         """Get the conversation history for the user"""
-        return self.cache.get(self.cache_key, [])
+        with _CACHE_LOCK:
+            return self.cache.get(self.cache_key, [])
 
     def add_message(self, messages: list):
         """Add messages to the conversation history"""
         if not messages:
             raise ValueError("Messages must be provided.")
         
-        if self.cache_key not in self.cache:
-            self.cache[self.cache_key] = []
-
-        self.cache[self.cache_key].extend(messages)
+        # Normalize to plain-string content so reads need no per-message conversion
+        normalized = [{"role": message["role"], "content": str(message["content"])} for message in messages]
+        with _CACHE_LOCK:
+            history = self.cache.get(self.cache_key)
+            if history is None:
+                history = deque(maxlen=AI_CONVERSATION_MAX_MESSAGES)
+            history.extend(normalized)
+            # Re-insert so the conversation's TTL restarts on every turn
+            self.cache[self.cache_key] = history
 
     def clear_conversation(self):
         """Clear the conversation history for the user"""
-        if self.cache_key in self.cache:
-            del self.cache[self.cache_key]
-            logger.info(f"Cleared conversation history for user: {self.user}")
+        with _CACHE_LOCK:
+            removed = self.cache.pop(self.cache_key, None) is not None
+        if removed:
+            logger.info("Cleared conversation history for user: %s", self.user)
         else:
-            logger.warning(f"No conversation history found for user: {self.user}")
+            logger.warning("No conversation history found for user: %s", self.user)
 
     def _generate_cache_key(self, user: str) -> str:
         """Generate cache key for user"""
@@ -1,27 +1,43 @@
-from typing import Optional
+from typing import Optional, Tuple
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import timedelta
 from jose import JWTError, jwt
 from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from cachetools import TTLCache
+import hashlib
+import threading
+import time
 
 from app.database.models import UserInDB, UserCreate, UserTable
-from app.settings import settings
 from app.database.session import SessionLocal
+from app.settings import settings
+from app.config import USER_CACHE_KEY_MAP
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Decoded tokens keyed by a truncated token digest, so raw tokens are never held in memory.
+# The cache is per worker process and account deletion only clears the handling worker's copy,
+# so on other workers a deleted user's token keeps passing read-only routes for up to the TTL;
+# routes that write user data pass verify_user to close that window.
+_TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=60)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+# Building a CryptContext is costly, so every Authentication instance shares this one
+PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class Authentication:
     """
     A class to handle authentication-related operations.
     """
-    def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    def authenticate_user(self, username: str, password: str) -> Optional[str]:
+    def authenticate_user(self, username: str, password: str, db: Session) -> Optional[str]:
         """Authenticate a user by username and password."""
-        user = self._get_user(username)
+        user = self._get_user(username, db)
         if not user:
             return None
         if not self.__verify_password(password, user.hashed_password):
@@ -30,81 +46,125 @@ class Authentication:
         access_token = self.__create_access_token(data={"sub": user.username})
         return access_token
     
-    def user_signup(self, user_data: UserCreate) -> UserInDB:
-        """Sign up a new user."""
-        if self._user_exists(user_data.username):
-            return None
-
-        user = self._store_user_signup(user_data)
-
-        return user
+    def user_signup(self, user_data: UserCreate, db: Session) -> Optional[UserInDB]:
+        """Sign up a new user. Returns None if the username or email is already taken."""
+        return self._store_user_signup(user_data, db)
     
-    def _get_user(self, username: str) -> Optional[UserInDB]:
+    def _get_user(self, username: str, db: Session) -> Optional[UserInDB]:
         """Retrieve a user from the database by username."""
-        db = SessionLocal()
-        user_row = db.query(UserTable).filter(UserTable.username == username).first()
-        db.close()
+        # Select only the needed columns so no ORM instance is built for a lookup
+        user_row = db.execute(
+            select(
+                UserTable.username,
+                UserTable.full_name,
+                UserTable.email,
+                UserTable.password,
+                UserTable.disabled,
+            ).where(UserTable.username == username)
+        ).first()
         if user_row:
             return UserInDB(
                 username=user_row.username,
                 full_name=user_row.full_name,
                 email=user_row.email,
-                hashed_password=getattr(user_row, 'password', None),
+                hashed_password=user_row.password,
                 disabled=user_row.disabled
             )
         return None
     
     
     def __verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return PWD_CONTEXT.verify(plain_password, hashed_password)
 
 
     def __create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
-        to_encode = data.copy()
-        expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-        to_encode.update({"exp": expire})
+        expires_in = int(expires_delta.total_seconds()) if expires_delta else _EXPIRE_SECONDS
+        to_encode = {**data, "exp": int(time.time()) + expires_in}
         return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
-    def _user_exists(self, username: str) -> bool:
-        """Check if a user exists in the database."""
-        db = SessionLocal()
-        exists = db.query(UserTable).filter(UserTable.username == username).first() is not None
-        db.close()
-        return exists
-
-    def _store_user_signup(self, user_data: UserCreate) -> UserInDB:
-        """Store user signup information in the SQLite database."""
-        hashed_password = self.pwd_context.hash(user_data.password)
-        db = SessionLocal()
-        user_row = UserTable(
-            username=user_data.username,
-            password=hashed_password,
-            full_name=user_data.full_name,
-            email=user_data.email,
-            disabled=False
+    def _store_user_signup(self, user_data: UserCreate, db: Session) -> Optional[UserInDB]:
+        """
+        Store user signup information in the SQLite database.
+        The insert is skipped on a username or email conflict, so the existence
+        check and the write are a single atomic statement.
+        """
+        hashed_password = PWD_CONTEXT.hash(user_data.password)
+        stmt = (
+            sqlite_insert(UserTable)
+            .values(
+                username=user_data.username,
+                password=hashed_password,
+                full_name=user_data.full_name,
+                email=user_data.email,
+                disabled=False
+            )
+            .on_conflict_do_nothing()
+            .returning(UserTable.id)
         )
-        db.add(user_row)
+        inserted = db.execute(stmt).first()
         db.commit()
-        db.refresh(user_row)
-        db.close()
+        if inserted is None:
+            return None
         return UserInDB(
-            username=user_row.username,
-            full_name=user_row.full_name,
-            email=user_row.email,
+            username=user_data.username,
+            full_name=user_data.full_name,
+            email=user_data.email,
             hashed_password=hashed_password,
-            disabled=user_row.disabled
+            disabled=False
         )
     
-    def decode_token(self, token: str):
+    def decode_token(self, token: str, db: Session):
         """Decode a JWT token and return the user if valid."""
+        user, _ = self._decode_token_with_expiry(token, db)
+        return user
+
+    def _decode_token_with_expiry(self, token: str, db: Session) -> Tuple[UserInDB, float]:
+        """Decode a JWT token and return the user along with the token expiry timestamp."""
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             username = payload.get("sub")
             if username is None:
                 raise HTTPException(status_code=401, detail="Invalid token")
-            user = self._get_user(username)
+            user = self._get_user(username, db)
             if user is None:
                 raise HTTPException(status_code=401, detail="User not found")
-            return user
+            return user, payload.get("exp", 0)
         except JWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+
+_authenticator = Authentication()
+
+def _user_exists(username: str) -> bool:
+    """Check that a user row still exists, without loading it"""
+    # A short-lived session, so the caller's request session never checks out a connection for the check
+    with SessionLocal() as session:
+        return session.execute(select(UserTable.id).where(UserTable.username == username)).first() is not None
+
+def cached_decode_token(token: str, db: Session, verify_user: bool = False) -> UserInDB:
+    """
+    Decode a JWT token, reusing the result of a previous successful decode.
+    Failed decodes are never cached. With verify_user, a cached user is checked
+    against the database so deleted accounts are rejected immediately.
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get(key)
+    if cached and cached[1] > time.time():
+        if verify_user and not _user_exists(cached[0].username):
+            invalidate_cached_tokens(cached[0].username)
+            raise HTTPException(status_code=401, detail="User not found")
+        return cached[0]
+
+    user, expires_at = _authenticator._decode_token_with_expiry(token, db)
+    user._cache_key = USER_CACHE_KEY_MAP.get(user.username, user.username)
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[key] = (user, expires_at)
+    return user
+
+def invalidate_cached_tokens(username: str):
+    """Drop every cached token of a user, e.g. once their account is deleted"""
+    with _TOKEN_CACHE_LOCK:
+        stale = [key for key, (user, _) in _TOKEN_CACHE.items() if user.username == username]
+        for key in stale:
+            _TOKEN_CACHE.pop(key, None)
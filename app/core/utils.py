@@ -1,7 +1,7 @@
-import uuid
+import os
 
 def generate_cache_key() -> str:
     """
     Generate a unique cache key for the conversation.
     """
-    return str(uuid.uuid4())
\ No newline at end of file
+    return os.urandom(16).hex()
\ No newline at end of file
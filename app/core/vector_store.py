@@ -1,22 +1,103 @@
-import json
 import os
+import hashlib
 import numpy as np
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from app.settings import settings
 from pathlib import Path
 import pickle
+import sqlite3
+import struct
+import time
 import logging
 import asyncio
 import aiohttp
-from functools import lru_cache
-import concurrent.futures
+import orjson
+from cachetools import LRUCache
+from collections import OrderedDict
 import threading
+import uuid
 
 logger = logging.getLogger(__name__)
 
 OPEN_AI_API_KEY = os.getenv("OPEN_AI_API_KEY", settings.OPEN_AI_API_KEY)
 
+EMBEDDING_DIM = 1536
+# Embeddings are unit-scale, so half precision keeps ample accuracy at a quarter of float64's size
+VECTOR_DTYPE = np.float16
+VECTOR_ROW_BYTES = EMBEDDING_DIM * np.dtype(VECTOR_DTYPE).itemsize
+VECTORS_FILENAME = "vectors.bin"
+LEGACY_VECTORS_FILENAME = "vectors.pkl"
+EMBEDDING_BATCH_SIZE = 2048
+
+# Embeddings are cached in memory and in a SQLite file under data_dir that survives restarts
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite3"
+EMBEDDING_MEMORY_CACHE_SIZE = 10_000
+EMBEDDING_CACHE_MAX_ROWS = 200_000
+EMBEDDING_CACHE_PRUNE_EVERY = 1_000
+
+# vectors.bin is a fixed header (magic, dimension, flags) followed by raw rows; the row count is derived from the file size
+VECTORS_MAGIC = b"VVF16\x00\x00\x00"
+VECTORS_HEADER = struct.Struct("<8sII")
+# Set when every row in the file is unit-length, so cosine similarity is a plain dot product
+VECTORS_FLAG_NORMALIZED = 1
+
+# Number of users whose search matrices are kept in memory between queries
+SEARCH_CACHE_SIZE = 64
+
+# Daily food logs and vector metadata are JSON Lines so inserts append lines instead of rewriting files
+FOOD_LOG_FILENAME = "food_log.jsonl"
+LEGACY_FOOD_LOG_FILENAME = "food_log.json"
+METADATA_FILENAME = "metadata.jsonl"
+LEGACY_METADATA_FILENAME = "metadata.json"
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+# Ranges spanning at least this many days list the user's logged days once instead of probing each date
+DATE_SCAN_MIN_DAYS = 7
+
+# Serializes writes to the per-user files within the process; reentrant because legacy
+# conversion takes it both from lock-free reads and from writers already holding it
+_WRITE_LOCK = threading.RLock()
+
+# All embedding I/O runs on one long-lived event loop so HTTP sessions can be reused across calls
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def _normalize_rows(rows: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length as float32, leaving all-zero rows as they are"""
+    rows = np.array(rows, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    rows /= norms
+    return rows
+
+def _append_bytes(path: Path, payload: bytes):
+    """Append payload to a file with a single O_APPEND write, creating the file if needed"""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    """Read a JSON Lines file, ignoring a trailing line left incomplete by an interrupted write"""
+    lines = path.read_bytes().split(b"\n")
+    # Every complete record ends with a newline, so the last piece is either empty or partial
+    return [orjson.loads(line) for line in lines[:-1] if line]
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared I/O event loop, starting its thread on first use"""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="vector-store-io", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
 class LocalVectorStore:
     """Local vector store for food logs using OpenAI embeddings API and local storage"""
     
@@ -39,214 +120,413 @@ class LocalVectorStore:
         # Use the latest and most cost-effective embedding model
         self.embedding_model = "text-embedding-3-small"  # 1536 dimensions, $0.02/1M tokens
         
-        # Cache for embeddings to reduce API calls
-        self._embedding_cache = {}
+        # Cache for embeddings to reduce API calls; only touched from the background loop
+        self._embedding_cache = LRUCache(maxsize=EMBEDDING_MEMORY_CACHE_SIZE)
+        self._embedding_db = self._open_embedding_cache()
+        self._embedding_cache_writes = 0
+        # Futures for embeddings currently being fetched, so concurrent requests for a text share one call
+        self._inflight: Dict[bytes, asyncio.Future] = {}
         
-        # Thread pool for async operations
-        self._thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        # HTTP session for the embeddings API, created lazily on the background loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # Per-user (file signature, float32 matrix, entry dates, metadata), least recently searched first
+        self._search_cache: OrderedDict[str, Tuple[tuple, np.ndarray, np.ndarray, List[dict]]] = OrderedDict()
+        self._search_cache_lock = threading.Lock()
         
     async def _get_embedding_async(self, text: str) -> List[float]:
         """Get embedding from OpenAI API"""
+        embeddings = await self._get_embeddings_async([text])
+        return embeddings[0]
+    
+    async def _get_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for several texts, fetching each uncached text once and sharing fetches already in flight"""
         # Check cache first
-        cache_key = hash(text)
-        if cache_key in self._embedding_cache:
-            return self._embedding_cache[cache_key]
-        
-        payload = {
-            "model": self.embedding_model,
-            "input": text,
-            "encoding_format": "float"
-        }
-        
+        keys = [self._embedding_cache_key(text) for text in texts]
+        cached = self._get_cached_embeddings(keys)
+        embeddings: List[Optional[List[float]]] = [cached.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        
+        # Join fetches already in flight and start one for each remaining distinct text
+        loop = asyncio.get_running_loop()
+        pending: Dict[bytes, asyncio.Future] = {}
+        owned: Dict[bytes, str] = {}
+        for i in missing:
+            key = keys[i]
+            if key in pending:
+                continue
+            if key not in self._inflight:
+                self._inflight[key] = loop.create_future()
+                owned[key] = texts[i]
+            pending[key] = self._inflight[key]
+        
+        if owned:
+            try:
+                fetched = await self._fetch_embeddings(list(owned), list(owned.values()))
+                for key, embedding in zip(owned, fetched):
+                    self._inflight[key].set_result(embedding)
+            finally:
+                for key in owned:
+                    future = self._inflight.pop(key)
+                    if not future.done():
+                        future.cancel()
+        
+        for i in missing:
+            embeddings[i] = await pending[keys[i]]
+        return embeddings
+    
+    async def _fetch_embeddings(self, keys: List[bytes], texts: List[str]) -> List[List[float]]:
+        """Fetch embeddings from the API in as few requests as possible, falling back to hash embeddings on error"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.embeddings_url, 
-                                      headers=self.headers, 
-                                      json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        embedding = result["data"][0]["embedding"]
-                        
-                        # Cache the result
-                        self._embedding_cache[cache_key] = embedding
-                        return embedding
-                    else:
+            fetched = []
+            session = self._get_session()
+            # The embeddings endpoint accepts at most EMBEDDING_BATCH_SIZE inputs per request
+            for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                payload = {
+                    "model": self.embedding_model,
+                    "input": texts[start:start + EMBEDDING_BATCH_SIZE],
+                    "encoding_format": "float"
+                }
+                async with session.post(self.embeddings_url, json=payload) as response:
+                    if response.status != 200:
                         error_text = await response.text()
-                        logger.error(f"OpenAI API error: {response.status} - {error_text}")
-                        return self._create_hash_embedding(text)
-                        
+                        logger.error("OpenAI API error: %s - %s", response.status, error_text)
+                        fetched = None
+                        break
+                    result = await response.json()
+                    # Results carry their input index; don't rely on response order
+                    fetched.extend(d["embedding"] for d in sorted(result["data"], key=lambda d: d["index"]))
         except Exception as e:
-            logger.error(f"Error calling OpenAI API: {e}")
-            return self._create_hash_embedding(text)
+            logger.error("Error calling OpenAI API: %s", e)
+            fetched = None
+        
+        if fetched is None:
+            return [self._create_hash_embedding(text) for text in texts]
+        
+        # Cache the result
+        self._store_cached_embeddings(dict(zip(keys, fetched)))
+        return fetched
+    
+    def _embedding_cache_key(self, text: str) -> bytes:
+        """Stable cache key for a text and the embedding model; unlike hash() it is the same in every process"""
+        return hashlib.blake2b(f"{self.embedding_model}\0{text}".encode('utf-8'), digest_size=16).digest()
+    
+    def _open_embedding_cache(self) -> sqlite3.Connection:
+        """Open the persistent embedding cache, creating it if needed"""
+        conn = sqlite3.connect(self.data_dir / EMBEDDING_CACHE_FILENAME, check_same_thread=False, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        conn.commit()
+        return conn
+    
+    def _get_cached_embeddings(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look keys up in the memory cache, then in the persistent cache"""
+        found = {key: self._embedding_cache[key] for key in keys if key in self._embedding_cache}
+        missing = [key for key in set(keys) if key not in found]
+        if not missing:
+            return found
+        
+        rows = []
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(self._embedding_db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall())
+        if not rows:
+            return found
+        
+        now = int(time.time())
+        self._embedding_db.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+        )
+        self._embedding_db.commit()
+        for key, vector in rows:
+            embedding = np.frombuffer(vector, dtype=VECTOR_DTYPE)
+            self._embedding_cache[key] = embedding
+            found[key] = embedding
+        return found
     
-    def _create_hash_embedding(self, text: str) -> List[float]:
+    def _store_cached_embeddings(self, embeddings: Dict[bytes, List[float]]):
+        """Add embeddings to the memory and persistent caches, evicting the least recently used rows"""
+        now = int(time.time())
+        rows = []
+        for key, embedding in embeddings.items():
+            vector = np.asarray(embedding, dtype=VECTOR_DTYPE)
+            self._embedding_cache[key] = vector
+            rows.append((key, vector.tobytes(), now))
+        self._embedding_db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+        )
+        
+        self._embedding_cache_writes += len(rows)
+        if self._embedding_cache_writes >= EMBEDDING_CACHE_PRUNE_EVERY:
+            self._embedding_cache_writes = 0
+            self._embedding_db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (EMBEDDING_CACHE_MAX_ROWS,)
+            )
+        self._embedding_db.commit()
+    
+    def _create_hash_embedding(self, text: str) -> np.ndarray:
         """Create a consistent hash-based embedding as fallback"""
-        import hashlib
-        
-        # Create embeddings with same dimensionality as text-embedding-3-small (1536)
-        embeddings = []
-        for i in range(32):  # Create 32 different hash seeds
-            hash_input = f"{text}_{i}".encode('utf-8')
-            hash_obj = hashlib.sha256(hash_input)
-            hash_bytes = hash_obj.digest()
-            
-            # Convert bytes to floats
-            for j in range(0, len(hash_bytes), 4):
-                if len(embeddings) >= 1536:
-                    break
-                byte_chunk = hash_bytes[j:j+4].ljust(4, b'\x00')
-                value = int.from_bytes(byte_chunk, byteorder='little', signed=True)
-                normalized_value = value / (2**31)  # Normalize to [-1, 1]
-                embeddings.append(normalized_value)
-        
-        # Pad to 1536 dimensions if needed
-        while len(embeddings) < 1536:
-            embeddings.append(0.0)
+        # One extendable-output hash gives 4 bytes for each of the EMBEDDING_DIM dimensions
+        raw = hashlib.shake_128(text.encode('utf-8')).digest(EMBEDDING_DIM * 4)
+        embedding = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2**31  # Normalize to [-1, 1]
         
         # Normalize the embedding vector
-        embedding_array = np.array(embeddings[:1536])
-        norm = np.linalg.norm(embedding_array)
+        norm = np.linalg.norm(embedding)
         if norm > 0:
-            embedding_array = embedding_array / norm
-        
-        return embedding_array.tolist()
+            embedding /= norm
+        return embedding
     
-    def _run_async_in_thread(self, coro):
-        """Run async function in a separate thread with its own event loop"""
-        def run_in_thread():
-            # Create a new event loop for this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(coro)
-            finally:
-                loop.close()
-        
-        # Run in thread pool to avoid blocking
-        future = self._thread_pool.submit(run_in_thread)
-        return future.result()
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the pooled HTTP session; must be called on the background loop"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=30),
+            )
+        return self._session
+    
+    async def aclose(self):
+        """Close the HTTP session and the embedding cache"""
+        self._embedding_db.close()
+        if self._session is None:
+            return
+        session, self._session = self._session, None
+        # The session belongs to the background loop, so it has to be closed there
+        future = asyncio.run_coroutine_threadsafe(session.close(), _get_background_loop())
+        await asyncio.wrap_future(future)
     
     def _get_embedding_sync(self, text: str) -> List[float]:
         """Synchronous wrapper for getting embeddings"""
-        try:
-            # Check if we're already in an async context
-            loop = asyncio.get_running_loop()
-            # If we get here, there's already a running loop
-            # Run the async function in a separate thread
-            return self._run_async_in_thread(self._get_embedding_async(text))
-        except RuntimeError:
-            # No running event loop, safe to create one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(self._get_embedding_async(text))
-            finally:
-                loop.close()
+        return self._get_embeddings_sync([text])[0]
+    
+    def _get_embeddings_sync(self, texts: List[str]) -> List[List[float]]:
+        """Synchronous wrapper for getting a batch of embeddings"""
+        future = asyncio.run_coroutine_threadsafe(self._get_embeddings_async(texts), _get_background_loop())
+        return future.result()
     
-    def _get_user_date_dir(self, username: str, date_obj: date) -> Path:
-        """Get directory path for user and date"""
+    async def aembed_text(self, text: str) -> np.ndarray:
+        """Get the unit-length float32 embedding of a text, using the store's embedding caches, from another event loop"""
+        future = asyncio.run_coroutine_threadsafe(self._get_embedding_async(text), _get_background_loop())
+        return _normalize_rows(await asyncio.wrap_future(future))[0]
+    
+    def _get_user_date_dir(self, username: str, date_obj: date, create: bool = True) -> Path:
+        """Get directory path for user and date, creating it unless only reading"""
         date_str = date_obj.strftime("%Y-%m-%d")
         user_dir = self.data_dir / "users" / username / date_str
-        user_dir.mkdir(parents=True, exist_ok=True)
+        if create:
+            user_dir.mkdir(parents=True, exist_ok=True)
         return user_dir
     
-    def _get_user_vector_dir(self, username: str) -> Path:
-        """Get vector storage directory for user"""
+    def _get_user_vector_dir(self, username: str, create: bool = True) -> Path:
+        """Get vector storage directory for user, creating it unless only reading"""
         vector_dir = self.data_dir / "vectors" / username
-        vector_dir.mkdir(parents=True, exist_ok=True)
+        if create:
+            vector_dir.mkdir(parents=True, exist_ok=True)
         return vector_dir
     
+    def _load_vectors(self, vector_dir: Path) -> Optional[np.ndarray]:
+        """Memory-map a user's stored vectors as a read-only (N, EMBEDDING_DIM) array"""
+        vectors_file = vector_dir / VECTORS_FILENAME
+        if not vectors_file.exists():
+            if not self._convert_legacy_vectors(vector_dir):
+                return None
+        
+        self._read_vectors_flags(vectors_file)
+        
+        count = (vectors_file.stat().st_size - VECTORS_HEADER.size) // VECTOR_ROW_BYTES
+        if count == 0:
+            return np.empty((0, EMBEDDING_DIM), dtype=VECTOR_DTYPE)
+        return np.memmap(vectors_file, dtype=VECTOR_DTYPE, mode='r',
+                         offset=VECTORS_HEADER.size, shape=(count, EMBEDDING_DIM))
+    
+    def _read_vectors_flags(self, vectors_file: Path) -> int:
+        """Validate a vector file's header and return its flags"""
+        with open(vectors_file, 'rb') as f:
+            magic, dim, flags = VECTORS_HEADER.unpack(f.read(VECTORS_HEADER.size))
+        if magic != VECTORS_MAGIC or dim != EMBEDDING_DIM:
+            raise ValueError(f"Unrecognized vector file: {vectors_file}")
+        return flags
+    
+    def _append_vectors(self, vector_dir: Path, embeddings: List[List[float]]):
+        """Append unit-length vectors to the user's vector file in one write; existing rows are never rewritten"""
+        vectors_file = vector_dir / VECTORS_FILENAME
+        if not vectors_file.exists() and not self._convert_legacy_vectors(vector_dir):
+            self._save_vectors(vector_dir, np.empty((0, EMBEDDING_DIM), dtype=VECTOR_DTYPE))
+        elif not self._read_vectors_flags(vectors_file) & VECTORS_FLAG_NORMALIZED:
+            # Normalize rows stored before vectors were normalized on insert, once, so the file stays uniform
+            self._save_vectors(vector_dir, self._load_vectors(vector_dir))
+        rows = _normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        _append_bytes(vectors_file, rows.astype(VECTOR_DTYPE).tobytes())
+    
+    def _save_vectors(self, vector_dir: Path, vectors: np.ndarray):
+        """Atomically replace a user's vector file with the given vectors scaled to unit length"""
+        tmp_file = vector_dir / (VECTORS_FILENAME + ".tmp")
+        rows = _normalize_rows(np.asarray(vectors).reshape(-1, EMBEDDING_DIM))
+        with open(tmp_file, 'wb') as f:
+            f.write(VECTORS_HEADER.pack(VECTORS_MAGIC, EMBEDDING_DIM, VECTORS_FLAG_NORMALIZED))
+            f.write(rows.astype(VECTOR_DTYPE).tobytes())
+        os.replace(tmp_file, vector_dir / VECTORS_FILENAME)
+    
+    def _convert_legacy_vectors(self, vector_dir: Path) -> bool:
+        """Convert a legacy vectors.pkl into the vector file format, returning False if there is none"""
+        legacy_file = vector_dir / LEGACY_VECTORS_FILENAME
+        if not legacy_file.exists():
+            return False
+        with _WRITE_LOCK:
+            # Another thread may have converted the file, and appended to it, while this one waited
+            if (vector_dir / VECTORS_FILENAME).exists():
+                return True
+            if not legacy_file.exists():
+                return False
+            with open(legacy_file, 'rb') as f:
+                vectors = np.asarray(pickle.load(f), dtype=VECTOR_DTYPE).reshape(-1, EMBEDDING_DIM)
+            self._save_vectors(vector_dir, vectors)
+            legacy_file.unlink()
+            return True
+    
     def store_food_entry(self, username: str, food_data: Dict[str, Any], entry_date: date = None) -> str:
         """Store food entry in both JSON and vector store"""
+        return self.store_food_entries_bulk(username, [food_data], entry_date)[0]
+    
+    def store_food_entries_bulk(self, username: str, food_entries: List[Dict[str, Any]], entry_date: date = None) -> List[str]:
+        """Store several food entries for one day, embedding them in a single API request"""
         if entry_date is None:
             entry_date = date.today()
+        if not food_entries:
+            return []
             
         # Store in JSON file
-        json_path = self._store_json_entry(username, food_data, entry_date)
+        self._store_json_entries(username, food_entries, entry_date)
         
         # Store in vector store
-        vector_id = self._store_vector_entry(username, food_data, entry_date)
+        vector_ids = self._store_vector_entries(username, food_entries, entry_date)
         
-        logger.info(f"Stored food entry for {username} on {entry_date}: {food_data['food_name']}")
-        return vector_id
+        for food_data in food_entries:
+            logger.info("Stored food entry for %s on %s: %s", username, entry_date, food_data['food_name'])
+        return vector_ids
     
-    def _store_json_entry(self, username: str, food_data: Dict[str, Any], entry_date: date) -> Path:
-        """Store food entry in JSON file"""
+    def _store_json_entries(self, username: str, food_entries: List[Dict[str, Any]], entry_date: date) -> Path:
+        """Append food entries to the day's JSON Lines log"""
         user_date_dir = self._get_user_date_dir(username, entry_date)
-        json_file = user_date_dir / "food_log.json"
-        
-        # Load existing entries or create new list
+        log_file = user_date_dir / FOOD_LOG_FILENAME
+        
+        timestamp = datetime.now().isoformat()
+        lines = []
+        for food_data in food_entries:
+            # Add timestamp and unique ID
+            food_data['timestamp'] = timestamp
+            # Use entry_id from food_data if present, else generate
+            if 'entry_id' not in food_data or not food_data['entry_id']:
+                food_data['entry_id'] = self._new_entry_id(username, entry_date)
+            lines.append(orjson.dumps(food_data, option=JSON_OPTIONS))
+        
+        with _WRITE_LOCK:
+            _append_bytes(log_file, b"\n".join(lines) + b"\n")
+        
+        return log_file
+    
+    def _new_entry_id(self, username: str, entry_date: date) -> str:
+        """Generate a unique entry ID without reading the existing entries"""
+        return f"{username}_{entry_date.strftime('%Y%m%d')}_{uuid.uuid4().hex[:12]}"
+    
+    def _read_food_log(self, user_date_dir: Path) -> List[Dict[str, Any]]:
+        """Read a day's food entries, including any from a legacy food_log.json"""
         entries = []
-        if json_file.exists():
-            with open(json_file, 'r') as f:
-                entries = json.load(f)
-        
-        # Add timestamp and unique ID
-        food_data['timestamp'] = datetime.now().isoformat()
-        # Use entry_id from food_data if present, else generate
-        if 'entry_id' not in food_data or not food_data['entry_id']:
-            food_data['entry_id'] = f"{username}_{entry_date.strftime('%Y%m%d')}_{len(entries) + 1}"
-        
-        entries.append(food_data)
-        
-        # Save back to file
-        with open(json_file, 'w') as f:
-            json.dump(entries, f, indent=2)
-        
-        return json_file
+        legacy_file = user_date_dir / LEGACY_FOOD_LOG_FILENAME
+        if legacy_file.exists():
+            entries.extend(orjson.loads(legacy_file.read_bytes()))
+        log_file = user_date_dir / FOOD_LOG_FILENAME
+        if log_file.exists():
+            entries.extend(_read_jsonl(log_file))
+        return entries
     
-    def _store_vector_entry(self, username: str, food_data: Dict[str, Any], entry_date: date) -> str:
-        """Store food entry in vector store"""
+    def _write_food_log(self, user_date_dir: Path, entries: List[Dict[str, Any]]):
+        """Atomically replace a day's food log, folding in any legacy food_log.json"""
+        tmp_file = user_date_dir / (FOOD_LOG_FILENAME + ".tmp")
+        tmp_file.write_bytes(b"".join(orjson.dumps(entry, option=JSON_OPTIONS) + b"\n" for entry in entries))
+        os.replace(tmp_file, user_date_dir / FOOD_LOG_FILENAME)
+        (user_date_dir / LEGACY_FOOD_LOG_FILENAME).unlink(missing_ok=True)
+    
+    def _store_vector_entries(self, username: str, food_entries: List[Dict[str, Any]], entry_date: date) -> List[str]:
+        """Store food entries in vector store"""
         vector_dir = self._get_user_vector_dir(username)
         
         # Create text for embedding
-        text_content = self._create_searchable_text(food_data, entry_date)
-        
-        # Generate embedding using OpenAI
-        embedding = self._get_embedding_sync(text_content)
+        text_contents = [self._create_searchable_text(food_data, entry_date) for food_data in food_entries]
         
-        # Load existing vectors or create new structure
-        vectors_file = vector_dir / "vectors.pkl"
-        metadata_file = vector_dir / "metadata.json"
+        # Generate all embeddings with one OpenAI request
+        embeddings = self._get_embeddings_sync(text_contents)
         
-        vectors = []
+        entry_ids = []
         metadata = []
-        
-        if vectors_file.exists():
-            with open(vectors_file, 'rb') as f:
-                vectors = pickle.load(f)
-        
-        if metadata_file.exists():
-            with open(metadata_file, 'r') as f:
-                metadata = json.load(f)
-        
-        # Add new entry
-        # Use the entry_id provided in food_data if present, else generate
-        entry_id = food_data.get('entry_id')
-        if not entry_id:
-            entry_id = f"{username}_{entry_date.strftime('%Y%m%d')}_{len(vectors) + 1}"
-            food_data['entry_id'] = entry_id
-        
-        vectors.append(embedding)
-        metadata.append({
-            'entry_id': entry_id,
-            'date': entry_date.isoformat(),
-            'food_name': food_data.get('food_name', ''),
-            'text_content': text_content,
-            'calories': food_data.get('calories', 0),
-            'protein': food_data.get('protein', 0),
-            'carbs': food_data.get('carbs', 0),
-            'fats': food_data.get('fats', 0)
-        })
-        
-        # Save vectors and metadata
-        with open(vectors_file, 'wb') as f:
-            pickle.dump(vectors, f)
-        
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        return entry_id
+        for food_data, text_content in zip(food_entries, text_contents):
+            # Add new entry
+            # Use the entry_id provided in food_data if present, else generate
+            entry_id = food_data.get('entry_id')
+            if not entry_id:
+                entry_id = self._new_entry_id(username, entry_date)
+                food_data['entry_id'] = entry_id
+            entry_ids.append(entry_id)
+            
+            metadata.append({
+                'entry_id': entry_id,
+                'date': entry_date.isoformat(),
+                'food_name': food_data.get('food_name', ''),
+                'text_content': text_content,
+                'calories': food_data.get('calories', 0),
+                'protein': food_data.get('protein', 0),
+                'carbs': food_data.get('carbs', 0),
+                'fats': food_data.get('fats', 0)
+            })
+        
+        # Append vectors and metadata; neither file is read back
+        with _WRITE_LOCK:
+            self._append_vectors(vector_dir, embeddings)
+            self._append_metadata(vector_dir, metadata)
+        
+        return entry_ids
+    
+    def _metadata_file(self, vector_dir: Path) -> Optional[Path]:
+        """Get the user's metadata file, falling back to a legacy metadata.json, or None if there is neither"""
+        for filename in (METADATA_FILENAME, LEGACY_METADATA_FILENAME):
+            metadata_file = vector_dir / filename
+            if metadata_file.exists():
+                return metadata_file
+        return None
+    
+    def _read_metadata(self, metadata_file: Path) -> List[Dict[str, Any]]:
+        """Read metadata records in either file format"""
+        if metadata_file.name == LEGACY_METADATA_FILENAME:
+            return orjson.loads(metadata_file.read_bytes())
+        return _read_jsonl(metadata_file)
+    
+    def _append_metadata(self, vector_dir: Path, records: List[Dict[str, Any]]):
+        """Append metadata records as JSON Lines, converting a legacy metadata.json first"""
+        legacy_file = vector_dir / LEGACY_METADATA_FILENAME
+        if legacy_file.exists() and not (vector_dir / METADATA_FILENAME).exists():
+            self._write_metadata(vector_dir, self._read_metadata(legacy_file))
+        _append_bytes(vector_dir / METADATA_FILENAME,
+                      b"".join(orjson.dumps(record, option=JSON_OPTIONS) + b"\n" for record in records))
+    
+    def _write_metadata(self, vector_dir: Path, records: List[Dict[str, Any]]):
+        """Atomically replace the user's metadata, removing any legacy metadata.json"""
+        tmp_file = vector_dir / (METADATA_FILENAME + ".tmp")
+        tmp_file.write_bytes(b"".join(orjson.dumps(record, option=JSON_OPTIONS) + b"\n" for record in records))
+        os.replace(tmp_file, vector_dir / METADATA_FILENAME)
+        (vector_dir / LEGACY_METADATA_FILENAME).unlink(missing_ok=True)
     
     def _create_searchable_text(self, food_data: Dict[str, Any], entry_date: date) -> str:
         """Create searchable text from food data"""
@@ -269,137 +549,163 @@ class LocalVectorStore:
     
     def search_food_entries(self, username: str, query: str, date_range: Optional[tuple] = None, top_k: int = 10) -> List[Dict[str, Any]]:
         """Search food entries using vector similarity"""
-        vector_dir = self._get_user_vector_dir(username)
-        vectors_file = vector_dir / "vectors.pkl"
-        metadata_file = vector_dir / "metadata.json"
-        
-        if not vectors_file.exists() or not metadata_file.exists():
+        vector_dir = self._get_user_vector_dir(username, create=False)
+        if top_k <= 0:
             return []
         
-        # Load vectors and metadata
-        with open(vectors_file, 'rb') as f:
-            vectors = pickle.load(f)
-        
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-        
-        if not vectors:
+        # Load vectors and metadata, reusing the cached copy while the files are unchanged
+        search_index = self._get_search_index(username, vector_dir)
+        if search_index is None:
             return []
+        matrix, dates, metadata = search_index
+        
+        # Filter by date range before scoring, so out-of-range rows are never compared
+        if date_range:
+            start, end = np.datetime64(date_range[0], 'D'), np.datetime64(date_range[1], 'D')
+            candidates = np.flatnonzero((dates >= start) & (dates <= end))
+            if len(candidates) == 0:
+                return []
+            matrix = matrix[candidates]
+        else:
+            candidates = None
         
         # Generate query embedding using OpenAI
         query_embedding = self._get_embedding_sync(query)
         
-        # Calculate similarities
-        similarities = []
-        for i, vector in enumerate(vectors):
-            similarity = np.dot(query_embedding, vector) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(vector)
-            )
-            similarities.append((similarity, i))
+        # Rows are unit-length, so cosine similarity against every candidate is a single matrix-vector product
+        query_vector = _normalize_rows(query_embedding)[0]
+        similarities = matrix @ query_vector
         
-        # Sort by similarity
-        similarities.sort(reverse=True)
+        # Select the top_k without sorting every similarity
+        k = min(top_k, len(similarities))
+        top_indices = np.argpartition(-similarities, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-similarities[top_indices])]
         
-        # Filter by date range if provided
         results = []
-        for similarity, idx in similarities[:top_k]:
-            entry_metadata = metadata[idx].copy()
-            entry_metadata['similarity'] = similarity
-            
-            # Filter by date range
-            if date_range:
-                entry_date = datetime.fromisoformat(entry_metadata['date']).date()
-                if not (date_range[0] <= entry_date <= date_range[1]):
-                    continue
-            
+        for idx in top_indices:
+            entry_metadata = metadata[idx if candidates is None else candidates[idx]].copy()
+            entry_metadata['similarity'] = float(similarities[idx])
             results.append(entry_metadata)
         
         return results
     
+    def _get_search_index(self, username: str, vector_dir: Path) -> Optional[Tuple[np.ndarray, np.ndarray, List[dict]]]:
+        """Get a user's unit-length float32 vector matrix, entry dates and metadata, loading them only when the files change"""
+        vectors_file = vector_dir / VECTORS_FILENAME
+        metadata_file = self._metadata_file(vector_dir)
+        if metadata_file is None:
+            return None
+        if not vectors_file.exists() and not self._convert_legacy_vectors(vector_dir):
+            return None
+        
+        # Every write either appends or replaces the file, so inode, size and mtime together detect changes
+        signature = tuple(
+            (st.st_ino, st.st_size, st.st_mtime_ns)
+            for st in (vectors_file.stat(), metadata_file.stat())
+        )
+        with self._search_cache_lock:
+            cached = self._search_cache.get(username)
+            if cached is not None and cached[0] == signature:
+                self._search_cache.move_to_end(username)
+                return cached[1:]
+        
+        vectors = self._load_vectors(vector_dir)
+        metadata = self._read_metadata(metadata_file)
+        if vectors is None or len(vectors) == 0:
+            return None
+        
+        # Ignore any trailing rows without metadata, e.g. from an interrupted write
+        matrix = np.asarray(vectors[:len(metadata)], dtype=np.float32)
+        if not self._read_vectors_flags(vectors_file) & VECTORS_FLAG_NORMALIZED:
+            matrix = _normalize_rows(matrix)
+        dates = np.array([m['date'] for m in metadata[:len(matrix)]], dtype='datetime64[D]')
+        
+        with self._search_cache_lock:
+            self._search_cache[username] = (signature, matrix, dates, metadata)
+            self._search_cache.move_to_end(username)
+            while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return matrix, dates, metadata
+    
     def get_food_entries_by_date_range(self, username: str, start_date: date, end_date: date) -> List[Dict[str, Any]]:
         """Get all food entries in a date range"""
         all_entries = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            user_date_dir = self._get_user_date_dir(username, current_date)
-            json_file = user_date_dir / "food_log.json"
-            
-            if json_file.exists():
-                with open(json_file, 'r') as f:
-                    entries = json.load(f)
-                    for entry in entries:
-                        entry['date'] = current_date.isoformat()
-                        all_entries.append(entry)
-            
-            current_date += timedelta(days=1)
+        for current_date in self._get_logged_dates(username, start_date, end_date):
+            user_date_dir = self._get_user_date_dir(username, current_date, create=False)
+            for entry in self._read_food_log(user_date_dir):
+                entry['date'] = current_date.isoformat()
+                all_entries.append(entry)
         
         return all_entries
     
+    def _get_logged_dates(self, username: str, start_date: date, end_date: date) -> List[date]:
+        """Get the dates in a range that may have food logs, in order"""
+        num_days = (end_date - start_date).days + 1
+        if num_days < DATE_SCAN_MIN_DAYS:
+            return [start_date + timedelta(days=i) for i in range(max(num_days, 0))]
+        
+        # One directory listing replaces a pair of stat calls for every day in a long range
+        try:
+            day_names = [entry.name for entry in os.scandir(self.data_dir / "users" / username) if entry.is_dir()]
+        except FileNotFoundError:
+            return []
+        logged_dates = []
+        for day_name in day_names:
+            try:
+                day = date.fromisoformat(day_name)
+            except ValueError:
+                continue
+            if start_date <= day <= end_date:
+                logged_dates.append(day)
+        return sorted(logged_dates)
+    
     def delete_food_entry(self, username: str, entry_id: str):
         """Delete a food entry from the vector store and metadata by entry_id"""
-        vector_dir = self._get_user_vector_dir(username)
-        vectors_file = vector_dir / "vectors.pkl"
-        metadata_file = vector_dir / "metadata.json"
-        
-        if not vectors_file.exists() or not metadata_file.exists():
-            logger.warning(f"No vector or metadata file found for user {username}")
+        vector_dir = self._get_user_vector_dir(username, create=False)
+        if not vector_dir.is_dir():
+            logger.warning("No vector or metadata file found for user %s", username)
             return False
         
-        with open(vectors_file, 'rb') as f:
-            vectors = pickle.load(f)
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
-        
-        # Find index of entry to delete
-        idx_to_delete = next((i for i, m in enumerate(metadata) if m.get('entry_id') == entry_id), None)
-        if idx_to_delete is None:
-            logger.warning(f"Entry {entry_id} not found in vector store for user {username}")
-            return False
-        
-        # Remove from both lists
-        vectors.pop(idx_to_delete)
-        metadata.pop(idx_to_delete)
-        
-        # Save back
-        with open(vectors_file, 'wb') as f:
-            pickle.dump(vectors, f)
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        # Also remove from food_log.json
-        # Find the date from metadata or entry_id
-        entry_date = None
-        if metadata and len(metadata) > 0:
-            # Try to find the date from the remaining metadata
-            for m in metadata:
-                if m.get('entry_id') == entry_id:
-                    entry_date = m.get('date')
-                    break
-        
-        if not entry_date:
-            # Fallback: parse from entry_id (format: username_YYYYMMDD_...)
-            try:
+        with _WRITE_LOCK:
+            vectors = self._load_vectors(vector_dir)
+            metadata_file = self._metadata_file(vector_dir)
+            if vectors is None or metadata_file is None:
+                logger.warning("No vector or metadata file found for user %s", username)
+                return False
+            
+            metadata = self._read_metadata(metadata_file)
+            
+            # Find index of entry to delete
+            idx_to_delete = next((i for i, m in enumerate(metadata) if m.get('entry_id') == entry_id), None)
+            if idx_to_delete is None:
+                logger.warning("Entry %s not found in vector store for user %s", entry_id, username)
+                return False
+            
+            # Remove from both; deletes are rare, so the vector file is rewritten in full
+            vectors = np.delete(vectors, idx_to_delete, axis=0)
+            entry_date = metadata.pop(idx_to_delete).get('date')
+            
+            # Save back
+            self._save_vectors(vector_dir, vectors)
+            self._write_metadata(vector_dir, metadata)
+            
+            if not entry_date:
+                # Fallback: parse from entry_id (format: username_YYYYMMDD_...)
                 parts = entry_id.split('_')
                 if len(parts) >= 3:
                     entry_date = f"{parts[1][:4]}-{parts[1][4:6]}-{parts[1][6:]}"
-            except Exception:
-                entry_date = None
-        
-        if entry_date:
-            user_date_dir = self._get_user_date_dir(username, datetime.strptime(entry_date, "%Y-%m-%d").date())
-            json_file = user_date_dir / "food_log.json"
-            if json_file.exists():
-                with open(json_file, 'r') as f:
-                    entries = json.load(f)
-                new_entries = [e for e in entries if e.get('entry_id') != entry_id]
-                with open(json_file, 'w') as f:
-                    json.dump(new_entries, f, indent=2)
-        
-        logger.info(f"Deleted entry {entry_id} from vector store and food_log.json for user {username}")
+            
+            # Also remove from the day's food log, rewriting it once
+            if entry_date:
+                try:
+                    user_date_dir = self._get_user_date_dir(username, date.fromisoformat(entry_date), create=False)
+                except ValueError:
+                    user_date_dir = None
+                if user_date_dir is not None:
+                    entries = self._read_food_log(user_date_dir)
+                    remaining = [e for e in entries if e.get('entry_id') != entry_id]
+                    if len(remaining) != len(entries):
+                        self._write_food_log(user_date_dir, remaining)
+        
+        logger.info("Deleted entry %s from vector store and food log for user %s", entry_id, username)
         return True
-    
-    def __del__(self):
-        """Cleanup thread pool"""
-        if hasattr(self, '_thread_pool'):
-            self._thread_pool.shutdown(wait=True)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from typing import Optional
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, Boolean
+from pydantic import BaseModel, Field, PrivateAttr
+from sqlalchemy import Column, Integer, String, Boolean, JSON
+from sqlalchemy.ext.mutable import MutableDict
 from .session import Base
 
 class UserCreate(BaseModel):
@@ -23,6 +24,8 @@ class User(BaseModel):
 # User in database model
 class UserInDB(User):
     hashed_password: str
+    # Conversation cache key, resolved once when the user's token is decoded
+    _cache_key: Optional[str] = PrivateAttr(default=None)
     
 # SQLAlchemy User table based on UserCreate fields
 class UserTable(Base):
@@ -34,8 +37,12 @@ class UserTable(Base):
     full_name = Column(String, nullable=True)
     email = Column(String, unique=True, index=True, nullable=True)
     disabled = Column(Boolean, default=False)
+    preferences = Column(MutableDict.as_mutable(JSON), default=dict)
+
+## AI Request/Response Models
+class AskAIRequest(BaseModel):
+    food_details: str = Field(..., min_length=1)
 
-## AI Response Model
 class AIResponse(BaseModel):
     response: str
 
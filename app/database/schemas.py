@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from datetime import date, datetime
 
@@ -9,6 +9,8 @@ class FoodEntryCreate(BaseModel):
 
 class FoodEntryResponse(BaseModel):
     """Schema for food entry responses"""
+    model_config = ConfigDict(from_attributes=True)
+
     entry_id: str
     food_name: str
     quantity: str
@@ -22,9 +24,6 @@ class FoodEntryResponse(BaseModel):
     timestamp: str
     date: date
 
-    class Config:
-        from_attributes = True
-
 class FoodLogSummary(BaseModel):
     """Schema for food log summaries"""
     date: date
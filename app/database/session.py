@@ -1,22 +1,69 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import json
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(" DatabaseSession ")
 
 ## set up the database connection
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, 'database', 'users.db')
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
-logger.info(f"Using database at: {SQLALCHEMY_DATABASE_URL}")
+logger.info("Using database at: %s", SQLALCHEMY_DATABASE_URL)
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=3600
 )
 
+# WAL lets readers run alongside the writer, and with synchronous=NORMAL commits no longer fsync every time
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-20000",
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLITE_PRAGMAS to every new pooled connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute("PRAGMA " + pragma)
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+def migrate_user_preferences():
+    """Add the users.preferences column to an existing database and move
+    preferences that were previously stored as JSON in full_name into it"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table("users"):
+            return
+        if "preferences" in {column["name"] for column in inspector.get_columns("users")}:
+            return
+        conn.execute(text("ALTER TABLE users ADD COLUMN preferences JSON"))
+        rows = conn.execute(text("SELECT id, full_name FROM users WHERE full_name LIKE '{%'")).all()
+        for user_id, full_name in rows:
+            try:
+                preferences = json.loads(full_name)
+            except ValueError:
+                continue
+            if not isinstance(preferences, dict):
+                continue
+            conn.execute(
+                text("UPDATE users SET preferences = :preferences, full_name = NULL WHERE id = :id"),
+                {"preferences": full_name, "id": user_id},
+            )
+        logger.info("Added users.preferences column, migrated %s profiles", len(rows))
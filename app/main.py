@@ -1,15 +1,43 @@
+import asyncio
+import logging
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+# Configure logging before importing app modules so their import-time messages are kept
+logging.basicConfig(level=logging.INFO)
+
 from app.api import api_router
+from app.api.routes import food_log, health
+from app.database.session import migrate_user_preferences
+from app.core.ai_client import close_openai_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrate_user_preferences()
+    food_log.init_services()
+    cpu_sampler = asyncio.create_task(health.sample_cpu_percent())
+    yield
+    cpu_sampler.cancel()
+    await close_openai_client()
+    await food_log.close_services()
+
 
 app = FastAPI(
     title="Viveo API",
     description="API for the Viveo application",
     version="1.0.0",
-    root_path="/viveo/api"
+    root_path="/viveo/api",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Compress larger JSON bodies such as food entry lists; event streams are left uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -1,75 +1,198 @@
-from openai import OpenAI
-from typing import Dict, Any
+from datetime import date
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
+from cachetools import LRUCache
+import asyncio
+import copy
+import hashlib
 import json
 import logging
+import re
+import threading
+import numpy as np
 from app.settings import settings
 from app import config
+from app.core.vector_store import LocalVectorStore, EMBEDDING_DIM
+from app.core.ai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
 AI_MODEL = config.SELECTED_AI_MODEL
 
+# Static so the prompt prefix is identical across requests and eligible for OpenAI prompt caching
+_SYSTEM_PROMPT = """You are a nutrition expert. Convert natural language food descriptions into structured JSON data.
+
+Expected JSON format:
+{
+    "food_name": "string - descriptive name of the food item",
+    "quantity": "string - amount consumed with units (e.g., 200g, 1 cup, 2 pieces)",
+    "calories": number - estimated calories (integer),
+    "protein": number - protein in grams (can be decimal),
+    "carbs": number - carbohydrates in grams (can be decimal),
+    "fats": number - fats in grams (can be decimal),
+    "fiber": number - fiber in grams (can be decimal),
+    "food_review": "string - brief nutritional assessment and health benefits",
+    "meal_type": "string - breakfast/lunch/dinner/snack/unknown",
+    "original_text": "string - the original input text"
+}
+
+Guidelines:
+- Provide realistic nutritional estimates based on standard food databases
+- Be specific with food names (e.g., Fresh Strawberries not just Strawberries)
+- Include cooking method when relevant
+- For portion sizes, be as accurate as possible based on the description
+- If quantity is not specified, estimate a reasonable serving size
+- Food review should be 1-2 sentences about nutritional value
+- Use integers for calories, decimals okay for macros"""
+
+# Values for fields missing from, or null in, the model's response
+_FIELD_DEFAULTS = MappingProxyType({
+    "food_name": "Unknown Food Item",
+    "quantity": "1 serving",
+    "calories": 200,
+    "protein": 10,
+    "carbs": 20,
+    "fats": 8,
+    "fiber": 3,
+    "food_review": "Nutritional information estimated",
+    "meal_type": "unknown",
+})
+
+# Calories are whole numbers, macros are rounded to one decimal
+_NUMERIC_FIELD_CASTS = (
+    ("calories", lambda value: int(float(value))),
+    ("protein", lambda value: round(float(value), 1)),
+    ("carbs", lambda value: round(float(value), 1)),
+    ("fats", lambda value: round(float(value), 1)),
+    ("fiber", lambda value: round(float(value), 1)),
+)
+
+# Structured results keyed by a digest of the normalized description, so repeat foods skip the API call
+_RESULT_CACHE = LRUCache(maxsize=1024)
+_RESULT_CACHE_LOCK = threading.Lock()
+_RESULT_CACHE_STATS = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+# Descriptions only share a result when they mention the same quantities, e.g. "1 apple" never matches "2 apples"
+_QUANTITY_PATTERN = re.compile(
+    r"\d+(?:[.,/]\d+)?|\b(?:a|an|half|one|two|three|four|five|six|seven|eight|nine|ten|dozen)\b",
+    re.IGNORECASE
+)
+
+# Number words as digits, so "one cup" and "1 cup" compare equal
+_QUANTITY_WORDS = MappingProxyType({
+    "a": "1", "an": "1", "one": "1", "half": "1/2", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10", "dozen": "12",
+})
+
+class _SemanticResultCache:
+    """Recent results indexed by description embedding, for reusing them on near-duplicate descriptions"""
+    
+    def __init__(self, maxsize: int):
+        self._vectors = np.zeros((maxsize, EMBEDDING_DIM), dtype=np.float32)
+        self._entries: List[Optional[Tuple[Tuple[str, ...], Dict[str, Any]]]] = [None] * maxsize
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+    
+    def get(self, embedding: np.ndarray, quantities: Tuple[str, ...], threshold: float) -> Optional[Dict[str, Any]]:
+        """Get a copy of the most similar cached result, if it clears the threshold and has the same quantities"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            similarities = self._vectors[:self._count] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold or self._entries[best][0] != quantities:
+                return None
+            return copy.deepcopy(self._entries[best][1])
+    
+    def put(self, embedding: np.ndarray, quantities: Tuple[str, ...], food_data: Dict[str, Any]):
+        """Add a result, replacing the oldest one once the cache is full"""
+        with self._lock:
+            self._vectors[self._next] = embedding
+            self._entries[self._next] = (quantities, copy.deepcopy(food_data))
+            self._next = (self._next + 1) % len(self._entries)
+            self._count = min(self._count + 1, len(self._entries))
+
+_SEMANTIC_CACHE = _SemanticResultCache(maxsize=1024)
+
+def _quantities(food_text: str) -> Tuple[str, ...]:
+    """The quantities of a description in order, with number words written as digits"""
+    quantities = []
+    for match in _QUANTITY_PATTERN.findall(food_text):
+        match = match.lower().replace(",", ".")
+        quantities.append(_QUANTITY_WORDS.get(match, match))
+    return tuple(quantities)
+
+def _result_cache_key(food_text: str) -> bytes:
+    """Cache key for a description, ignoring case and whitespace differences"""
+    normalized = " ".join(food_text.lower().split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+def get_result_cache_stats() -> Dict[str, int]:
+    """Hit, miss and size counts of the food processing result caches"""
+    with _RESULT_CACHE_LOCK:
+        return {**_RESULT_CACHE_STATS, "size": len(_RESULT_CACHE)}
+
 class FoodProcessor:
     """Service to process natural language food descriptions into structured data"""
     
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPEN_AI_API_KEY)
+    def __init__(self, vector_store: Optional[LocalVectorStore] = None):
+        # Shares the AI assistant's async client and connection pool
+        self.client = get_openai_client()
+        # Embeds descriptions for the semantic result cache, which is skipped without a store
+        self.vector_store = vector_store
 
-    def process_food_description(self, food_text: str) -> Dict[str, Any]:
+    async def process_food_description(self, food_text: str) -> Dict[str, Any]:
         """Convert natural language food description to structured data"""
         
-        from datetime import date
-        today_str = date.today().isoformat()
+        cache_key = _result_cache_key(food_text)
+        with _RESULT_CACHE_LOCK:
+            cached = _RESULT_CACHE.get(cache_key)
+            if cached is not None:
+                _RESULT_CACHE_STATS["hits"] += 1
+        if cached is not None:
+            # Callers add fields to the result, so they get their own copy
+            food_data = copy.deepcopy(cached)
+            food_data['original_text'] = food_text
+            return food_data
         
-        # Use string concatenation instead of f-strings to avoid conflicts
-        system_prompt = ("Today is " + today_str + ". "
-                        "You are a nutrition expert. Convert natural language food descriptions into structured JSON data.\n\n"
-                        "IMPORTANT: Return ONLY valid JSON, no additional text, markdown, or formatting.\n\n"
-                        "Expected JSON format:\n"
-                        "{\n"
-                        '    "food_name": "string - descriptive name of the food item",\n'
-                        '    "quantity": "string - amount consumed with units (e.g., 200g, 1 cup, 2 pieces)",\n'
-                        '    "calories": number - estimated calories (integer),\n'
-                        '    "protein": number - protein in grams (can be decimal),\n'
-                        '    "carbs": number - carbohydrates in grams (can be decimal),\n'
-                        '    "fats": number - fats in grams (can be decimal),\n'
-                        '    "fiber": number - fiber in grams (can be decimal),\n'
-                        '    "food_review": "string - brief nutritional assessment and health benefits",\n'
-                        '    "meal_type": "string - breakfast/lunch/dinner/snack/unknown",\n'
-                        '    "original_text": "string - the original input text"\n'
-                        "}\n\n"
-                        "Guidelines:\n"
-                        "- Provide realistic nutritional estimates based on standard food databases\n"
-                        "- Be specific with food names (e.g., Fresh Strawberries not just Strawberries)\n"
-                        "- Include cooking method when relevant\n"
-                        "- For portion sizes, be as accurate as possible based on the description\n"
-                        "- If quantity is not specified, estimate a reasonable serving size\n"
-                        "- Food review should be 1-2 sentences about nutritional value\n"
-                        "- Use integers for calories, decimals okay for macros")
-
+        # Near-duplicates are found before the completion is sent, so they save its cost. When overlap
+        # is enabled, the completion is sent first and only abandoned on a hit, once already billed.
+        completion = None
+        if settings.FOOD_SEMANTIC_CACHE_OVERLAP:
+            completion = asyncio.create_task(self._request_food_data(food_text))
+        embedding = None
+        quantities = _quantities(food_text)
         try:
-            # Create user message without f-string
-            user_message = "Convert this food description to structured JSON: " + food_text
-            
-            response = self.client.chat.completions.create(
-                model=AI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.2
-            )
-            
-            response_text = response.choices[0].message.content.strip()
-            logger.info(f"AI response for food processing: {response_text}")
-            
-            # Clean up response if it has markdown formatting
-            if response_text.startswith("```json"):
-                response_text = response_text.replace("```json", "").replace("```", "").strip()
-            elif response_text.startswith("```"):
-                response_text = response_text.replace("```", "").strip()
+            if self.vector_store is not None:
+                try:
+                    embedding = await self.vector_store.aembed_text(food_text)
+                except Exception as e:
+                    logger.warning("Embedding failed, skipping the semantic result cache: %s", e)
+            if embedding is not None:
+                food_data = _SEMANTIC_CACHE.get(embedding, quantities, settings.FOOD_SEMANTIC_CACHE_THRESHOLD)
+                if food_data is not None:
+                    if completion is not None:
+                        completion.cancel()
+                    food_data['original_text'] = food_text
+                    with _RESULT_CACHE_LOCK:
+                        _RESULT_CACHE_STATS["semantic_hits"] += 1
+                        _RESULT_CACHE[cache_key] = copy.deepcopy(food_data)
+                    return food_data
+        except BaseException:
+            if completion is not None:
+                completion.cancel()
+            raise
+        
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE_STATS["misses"] += 1
+        
+        try:
+            if completion is None:
+                completion = self._request_food_data(food_text)
+            response_text = await completion
             
-            # Try to parse JSON response
+            # Parse JSON response; it can only be invalid if the output was cut off
             try:
                 food_data = json.loads(response_text)
                 food_data['original_text'] = food_text
@@ -77,46 +200,59 @@ class FoodProcessor:
                 # Ensure all required fields exist with defaults
                 food_data = self._ensure_required_fields(food_data, food_text)
                 
+                # Only parsed results are cached; fallback entries are retried next time
+                with _RESULT_CACHE_LOCK:
+                    _RESULT_CACHE[cache_key] = copy.deepcopy(food_data)
+                if embedding is not None:
+                    _SEMANTIC_CACHE.put(embedding, quantities, food_data)
                 return food_data
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from AI response: {response_text}")
-                logger.error(f"JSON error: {e}")
+                logger.error("Failed to parse JSON from AI response: %s", response_text)
+                logger.error("JSON error: %s", e)
                 return self._create_fallback_entry(food_text)
                 
         except Exception as e:
-            logger.error(f"Error processing food description: {e}")
+            logger.error("Error processing food description: %s", e)
             return self._create_fallback_entry(food_text)
     
+    async def _request_food_data(self, food_text: str) -> str:
+        """Ask the model for the structured JSON of a food description"""
+        # The date goes in the user message so the system prompt stays a cacheable prefix
+        user_message = "Today is " + date.today().isoformat() + ". Convert this food description to structured JSON: " + food_text
+        
+        response = await self.client.chat.completions.create(
+            model=AI_MODEL,
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.2,
+            # JSON mode guarantees a JSON object, so no markdown fences to strip
+            response_format={"type": "json_object"}
+        )
+        
+        response_text = response.choices[0].message.content.strip()
+        logger.info("AI response for food processing: %s", response_text)
+        usage = response.usage
+        if usage is not None and usage.prompt_tokens_details is not None:
+            logger.info("Food processing prompt tokens: %s (%s cached)",
+                        usage.prompt_tokens, usage.prompt_tokens_details.cached_tokens)
+        return response_text
+    
     def _ensure_required_fields(self, food_data: Dict[str, Any], original_text: str) -> Dict[str, Any]:
         """Ensure all required fields exist with reasonable defaults"""
-        defaults = {
-            "food_name": "Unknown Food Item",
-            "quantity": "1 serving",
-            "calories": 200,
-            "protein": 10,
-            "carbs": 20,
-            "fats": 8,
-            "fiber": 3,
-            "food_review": "Nutritional information estimated",
-            "meal_type": "unknown",
-            "original_text": original_text
-        }
-        
-        for key, default_value in defaults.items():
-            if key not in food_data or food_data[key] is None:
+        for key, default_value in _FIELD_DEFAULTS.items():
+            if food_data.get(key) is None:
                 food_data[key] = default_value
+        if food_data.get("original_text") is None:
+            food_data["original_text"] = original_text
         
         # Ensure numeric fields are actually numeric
-        numeric_fields = ["calories", "protein", "carbs", "fats", "fiber"]
-        for field in numeric_fields:
+        for field, cast in _NUMERIC_FIELD_CASTS:
             try:
-                # Convert to appropriate numeric type
-                if field == "calories":
-                    food_data[field] = int(float(food_data[field]))
-                else:
-                    food_data[field] = round(float(food_data[field]), 1)
+                food_data[field] = cast(food_data[field])
             except (ValueError, TypeError):
-                food_data[field] = defaults[field]
+                food_data[field] = _FIELD_DEFAULTS[field]
         
         return food_data
     
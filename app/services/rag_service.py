@@ -1,35 +1,129 @@
+import asyncio
 from datetime import date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import re
 from app.core.vector_store import LocalVectorStore
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _this_week(today: date) -> tuple:
+    """From the start of the current week through today"""
+    return (today - timedelta(days=today.weekday()), today)
+
+def _last_week(today: date) -> tuple:
+    """The previous Monday-to-Sunday week"""
+    last_week_end = today - timedelta(days=today.weekday() + 1)
+    return (last_week_end - timedelta(days=6), last_week_end)
+
+def _this_month(today: date) -> tuple:
+    """From the start of the current month through today"""
+    return (today.replace(day=1), today)
+
+def _last_days(days: int) -> Callable[[date], tuple]:
+    """Range covering the given number of days up to today"""
+    return lambda today: (today - timedelta(days=days), today)
+
+# Date range for each temporal expression, in priority order: when a query mentions several,
+# the earliest one here wins regardless of where it appears ("yesterday vs today" means today).
+# Specific phrases come before "week" and "month" so "last week" is not read as this week.
+_TEMPORAL_RANGES: Dict[str, Callable[[date], tuple]] = {
+    "today": lambda today: (today, today),
+    "yesterday": lambda today: (today - timedelta(days=1), today - timedelta(days=1)),
+    "last week": _last_week,
+    "past week": _last_days(7),
+    "last 7 days": _last_days(7),
+    "last 30 days": _last_days(30),
+    "past month": _last_days(30),
+    "this week": _this_week,
+    "this month": _this_month,
+    "week": _this_week,
+    "month": _this_month,
+}
+_TEMPORAL_PRIORITY = {phrase: priority for priority, phrase in enumerate(_TEMPORAL_RANGES)}
+# Whole words, allowing a plural or adverb suffix so "weeks" and "weekly" still mean the week range
+_TEMPORAL_PATTERN = re.compile(
+    r"\b(" + "|".join(map(re.escape, _TEMPORAL_RANGES)) + r")(?:s|ly)?\b", re.IGNORECASE
+)
+
+_ENTRY_TEMPLATE = (
+    "Date: {date}\n"
+    "Food: {food_name}\n"
+    "Calories: {calories}\n"
+    "Protein: {protein}g, Carbs: {carbs}g, Fats: {fats}g\n"
+    "Original: {text_content}"
+)
+
+_DEFAULT_HEADING = "Based on your food log entries, here's what I found:"
+_FALLBACK_HEADING = (
+    "No food log entries were found for the requested period. "
+    "These are the closest matches from other dates:"
+)
+
+_CONTEXT_TEMPLATE = (
+    "{heading}\n"
+    "\n"
+    "FOOD ENTRIES:\n"
+    "{entries}\n"
+    "\n"
+    "SUMMARY:\n"
+    "Total entries found: {count}\n"
+    "Total calories: {calories}\n"
+    "Total protein: {protein}g\n"
+    "Total carbs: {carbs}g\n"
+    "Total fats: {fats}g\n"
+    "\n"
+    "Original query: {query}"
+)
+
+# Nutrients summed across the matched entries
+_TOTAL_FIELDS = ("calories", "protein", "carbs", "fats")
+
+class _DefaultDict(dict):
+    """Mapping for str.format_map that renders missing fields as empty strings"""
+    def __missing__(self, key):
+        return ''
+
 class RAGService:
     """RAG service for querying food logs"""
     
-    def __init__(self):
-        self.vector_store = LocalVectorStore()
+    def __init__(self, vector_store: Optional[LocalVectorStore] = None):
+        # Share the food log's store so searches reuse its embedding and matrix caches
+        self.vector_store = vector_store or LocalVectorStore()
     
-    def query_food_history(self, username: str, query: str) -> str:
-        """Query user's food history using RAG"""
+    async def query_food_history(self, username: str, query: str, today: Optional[date] = None) -> str:
+        """Query user's food history using RAG, resolving relative periods against today unless a date is given"""
         
         # Parse temporal information from query
-        date_range = self._parse_temporal_query(query)
+        date_range = self._parse_temporal_query(query, today)
+        heading = _DEFAULT_HEADING
         
-        # Search vector store
         if date_range:
-            # Use date range for specific time period queries
-            search_results = self.vector_store.search_food_entries(
-                username=username,
-                query=query,
-                date_range=date_range,
-                top_k=20
+            # Run the date-ranged search and a general fallback search concurrently;
+            # both share one query embedding through the vector store's caches
+            search_results, fallback_results = await asyncio.gather(
+                asyncio.to_thread(
+                    self.vector_store.search_food_entries,
+                    username=username,
+                    query=query,
+                    date_range=date_range,
+                    top_k=20
+                ),
+                asyncio.to_thread(
+                    self.vector_store.search_food_entries,
+                    username=username,
+                    query=query,
+                    top_k=10
+                ),
             )
+            # Fallback entries are only used on their own so they never skew the period totals
+            if not search_results and fallback_results:
+                search_results = fallback_results
+                heading = _FALLBACK_HEADING
         else:
             # General search for recent entries
-            search_results = self.vector_store.search_food_entries(
+            search_results = await asyncio.to_thread(
+                self.vector_store.search_food_entries,
                 username=username,
                 query=query,
                 top_k=10
@@ -39,91 +133,32 @@ class RAGService:
             return "I don't have any food log entries matching your query."
         
         # Format results for AI context
-        context = self._format_search_results(search_results, query)
+        context = self._format_search_results(search_results, query, heading)
         return context
     
-    def _parse_temporal_query(self, query: str) -> Optional[tuple]:
-        """Parse temporal expressions from query"""
-        query_lower = query.lower()
-        today = date.today()
-        
-        # Today
-        if 'today' in query_lower:
-            return (today, today)
-        
-        # Yesterday
-        if 'yesterday' in query_lower:
-            yesterday = today - timedelta(days=1)
-            return (yesterday, yesterday)
-        
-        # This week
-        if 'this week' in query_lower or 'week' in query_lower:
-            week_start = today - timedelta(days=today.weekday())
-            return (week_start, today)
-        
-        # Last week
-        if 'last week' in query_lower:
-            last_week_end = today - timedelta(days=today.weekday() + 1)
-            last_week_start = last_week_end - timedelta(days=6)
-            return (last_week_start, last_week_end)
-        
-        # This month
-        if 'this month' in query_lower or 'month' in query_lower:
-            month_start = today.replace(day=1)
-            return (month_start, today)
-        
-        # Last 7 days
-        if 'last 7 days' in query_lower or 'past week' in query_lower:
-            week_ago = today - timedelta(days=7)
-            return (week_ago, today)
-        
-        # Last 30 days
-        if 'last 30 days' in query_lower or 'past month' in query_lower:
-            month_ago = today - timedelta(days=30)
-            return (month_ago, today)
-        
-        return None
+    def _parse_temporal_query(self, query: str, today: Optional[date] = None) -> Optional[tuple]:
+        """Parse temporal expressions from query relative to today, which defaults to the current date"""
+        phrases = [phrase.lower() for phrase in _TEMPORAL_PATTERN.findall(query)]
+        if not phrases:
+            return None
+        phrase = min(phrases, key=_TEMPORAL_PRIORITY.__getitem__)
+        return _TEMPORAL_RANGES[phrase](today or date.today())
     
-    def _format_search_results(self, results: List[Dict[str, Any]], original_query: str) -> str:
+    def _format_search_results(self, results: List[Dict[str, Any]], original_query: str,
+                               heading: str = _DEFAULT_HEADING) -> str:
         """Format search results for AI context"""
         if not results:
             return "No food entries found."
         
-        formatted_entries = []
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fats = 0
-        
-        for result in results:
-            entry = f"""
-Date: {result['date']}
-Food: {result['food_name']}
-Calories: {result['calories']}
-Protein: {result['protein']}g, Carbs: {result['carbs']}g, Fats: {result['fats']}g
-Original: {result.get('text_content', '')}
-"""
-            formatted_entries.append(entry.strip())
-            
-            # Calculate totals
-            total_calories += result.get('calories', 0)
-            total_protein += result.get('protein', 0)
-            total_carbs += result.get('carbs', 0)
-            total_fats += result.get('fats', 0)
+        # Transpose the per-entry nutrient tuples and sum each column in one pass
+        totals = dict(zip(_TOTAL_FIELDS, map(sum, zip(*(
+            tuple(result.get(field, 0) for field in _TOTAL_FIELDS) for result in results
+        )))))
         
-        context = f"""
-Based on your food log entries, here's what I found:
-
-FOOD ENTRIES:
-{chr(10).join(formatted_entries)}
-
-SUMMARY:
-Total entries found: {len(results)}
-Total calories: {total_calories}
-Total protein: {total_protein}g
-Total carbs: {total_carbs}g
-Total fats: {total_fats}g
-
-Original query: {original_query}
-"""
-        return context.strip()
\ No newline at end of file
+        return _CONTEXT_TEMPLATE.format(
+            heading=heading,
+            entries="\n".join(_ENTRY_TEMPLATE.format_map(_DefaultDict(result)) for result in results),
+            count=len(results),
+            query=original_query,
+            **totals
+        )
\ No newline at end of file
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import List
 
 class Settings(BaseSettings):
     SECRET_KEY: str
@@ -7,6 +8,13 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     CLAUDE_API_KEY: str
     OPEN_AI_API_KEY: str
+    # Minimum cosine similarity for reusing the result of a previously processed food description
+    FOOD_SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    # Send the food completion while the semantic cache is checked, cutting miss latency by one
+    # embeddings round trip; near-duplicates then no longer save the completion's cost
+    FOOD_SEMANTIC_CACHE_OVERLAP: bool = False
+    # Users allowed to read /admin/stats, as a JSON list; the endpoint is closed to everyone when empty
+    ADMIN_USERNAMES: List[str] = []
 
     model_config = SettingsConfigDict(
         env_file=Path(__file__).parent / ".env"
@@ -20,6 +20,7 @@ CREATE TABLE IF NOT EXISTS users (
     weight DECIMAL(5,2) NULL,
     height INT NULL,
     activity_level ENUM('sedentary', 'lightly_active', 'moderately_active', 'very_active', 'extremely_active') DEFAULT 'moderately_active',
+    preferences JSON NULL,
     
     INDEX idx_username (username),
     INDEX idx_email (email),
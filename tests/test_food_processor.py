@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+# Settings are read at import time
+for key in ("SECRET_KEY", "CLAUDE_API_KEY", "OPEN_AI_API_KEY"):
+    os.environ.setdefault(key, "test")
+
+from app.core.vector_store import EMBEDDING_DIM
+from app.services import food_processor
+from app.services.food_processor import FoodProcessor, _SemanticResultCache, _quantities
+
+
+def _unit_vector(index: int) -> np.ndarray:
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+
+class QuantitiesTest(unittest.TestCase):
+    def test_number_words_match_digits(self):
+        self.assertEqual(_quantities("1 cup coffee"), _quantities("one cup of black coffee"))
+        self.assertEqual(_quantities("an apple"), ("1",))
+        self.assertEqual(_quantities("half a dozen eggs"), ("1/2", "1", "12"))
+
+    def test_different_quantities_differ(self):
+        self.assertNotEqual(_quantities("1 apple"), _quantities("2 apples"))
+        self.assertNotEqual(_quantities("one apple"), _quantities("two apples"))
+
+    def test_decimal_comma_matches_point(self):
+        self.assertEqual(_quantities("1,5 cups rice"), _quantities("1.5 cups rice"))
+
+
+class SemanticResultCacheTest(unittest.TestCase):
+    def test_reuses_result_for_number_word_rewording(self):
+        cache = _SemanticResultCache(maxsize=4)
+        cache.put(_unit_vector(0), _quantities("1 cup coffee"), {"food_name": "Coffee"})
+
+        food_data = cache.get(_unit_vector(0), _quantities("one cup of black coffee"), threshold=0.95)
+
+        self.assertEqual(food_data, {"food_name": "Coffee"})
+
+    def test_rejects_different_quantities(self):
+        cache = _SemanticResultCache(maxsize=4)
+        cache.put(_unit_vector(0), _quantities("1 apple"), {"food_name": "Apple"})
+
+        self.assertIsNone(cache.get(_unit_vector(0), _quantities("2 apples"), threshold=0.95))
+
+    def test_rejects_dissimilar_descriptions(self):
+        cache = _SemanticResultCache(maxsize=4)
+        cache.put(_unit_vector(0), _quantities("1 cup coffee"), {"food_name": "Coffee"})
+
+        self.assertIsNone(cache.get(_unit_vector(1), _quantities("1 cup tea"), threshold=0.95))
+
+
+class SemanticCacheCompletionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.completions = []
+        # Every description embeds to the same vector, so only the quantity gate tells them apart
+        self.processor = FoodProcessor(vector_store=SimpleNamespace(aembed_text=self._embed))
+        self.processor.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        )
+        for target, value in (
+            ("_RESULT_CACHE", {}),
+            ("_SEMANTIC_CACHE", _SemanticResultCache(maxsize=4)),
+            ("_RESULT_CACHE_STATS", {"hits": 0, "semantic_hits": 0, "misses": 0}),
+        ):
+            patcher = mock.patch.object(food_processor, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(food_processor.settings, "FOOD_SEMANTIC_CACHE_OVERLAP", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _embed(self, text):
+        # Yield like a real embeddings request, so a completion started alongside would get sent
+        await asyncio.sleep(0)
+        return _unit_vector(0)
+
+    async def _create(self, **kwargs):
+        self.completions.append(kwargs)
+        message = SimpleNamespace(content=json.dumps({"food_name": "Coffee", "calories": 5}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    async def test_near_duplicate_skips_the_completion(self):
+        await self.processor.process_food_description("1 cup coffee")
+        food_data = await self.processor.process_food_description("one cup of black coffee")
+
+        self.assertEqual(len(self.completions), 1)
+        self.assertEqual(food_data["food_name"], "Coffee")
+        self.assertEqual(food_data["original_text"], "one cup of black coffee")
+
+    async def test_different_quantity_requests_a_completion(self):
+        await self.processor.process_food_description("1 cup coffee")
+        await self.processor.process_food_description("2 cups coffee")
+
+        self.assertEqual(len(self.completions), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import unittest
+from datetime import date
+
+# Settings are read at import time
+for key in ("SECRET_KEY", "CLAUDE_API_KEY", "OPEN_AI_API_KEY"):
+    os.environ.setdefault(key, "test")
+
+from app.services.rag_service import RAGService
+
+# A Wednesday, so this week and last week differ
+TODAY = date(2025, 3, 5)
+
+
+class ParseTemporalQueryTest(unittest.TestCase):
+    def setUp(self):
+        # Parsing never touches the store
+        self.service = RAGService(vector_store=object())
+
+    def parse(self, query):
+        return self.service._parse_temporal_query(query, TODAY)
+
+    def test_today_wins_over_yesterday_wherever_it_appears(self):
+        self.assertEqual(self.parse("yesterday vs today"), (TODAY, TODAY))
+        self.assertEqual(self.parse("today vs yesterday"), (TODAY, TODAY))
+
+    def test_weekly_and_weeks_mean_this_week(self):
+        this_week = (date(2025, 3, 3), TODAY)
+        self.assertEqual(self.parse("my weekly protein"), this_week)
+        self.assertEqual(self.parse("calories over the weeks"), this_week)
+
+    def test_monthly_means_this_month(self):
+        self.assertEqual(self.parse("Monthly summary"), (date(2025, 3, 1), TODAY))
+
+    def test_last_week_is_not_this_week(self):
+        self.assertEqual(self.parse("what did I eat last week"), (date(2025, 2, 24), date(2025, 3, 2)))
+
+    def test_past_month_is_last_30_days(self):
+        self.assertEqual(self.parse("carbs in the past month"), (date(2025, 2, 3), TODAY))
+
+    def test_words_containing_a_phrase_do_not_match(self):
+        self.assertIsNone(self.parse("what did I eat on the weekday"))
+        self.assertIsNone(self.parse("how much protein do I need"))
+
+
+if __name__ == "__main__":
+    unittest.main()
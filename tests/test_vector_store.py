@@ -0,0 +1,151 @@
+import asyncio
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+# Settings are read at import time
+for key in ("SECRET_KEY", "CLAUDE_API_KEY", "OPEN_AI_API_KEY"):
+    os.environ.setdefault(key, "test")
+
+from app.core.vector_store import (
+    EMBEDDING_DIM,
+    FOOD_LOG_FILENAME,
+    LEGACY_FOOD_LOG_FILENAME,
+    LEGACY_METADATA_FILENAME,
+    LEGACY_VECTORS_FILENAME,
+    METADATA_FILENAME,
+    VECTORS_FILENAME,
+    VECTORS_FLAG_NORMALIZED,
+    VECTORS_HEADER,
+    VECTORS_MAGIC,
+    LocalVectorStore,
+    _read_jsonl,
+)
+
+FOODS = ("apple", "rice", "banana", "salmon")
+DAY = date(2025, 3, 5)
+
+
+def _food_vector(text: str) -> list:
+    """One dimension per known food, so a query for a food is closest to the entries naming it"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for i, food in enumerate(FOODS):
+        if food in text.lower():
+            vector[i] = 1.0
+    return vector.tolist()
+
+
+class _KeywordEmbeddingStore(LocalVectorStore):
+    """Store whose embeddings come from food keywords instead of the OpenAI API"""
+
+    async def _fetch_embeddings(self, keys, texts):
+        return [_food_vector(text) for text in texts]
+
+
+class VectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        self.store = _KeywordEmbeddingStore(data_dir=self.data_dir)
+        self.addCleanup(lambda: asyncio.run(self.store.aclose()))
+        self.vector_dir = Path(self.data_dir) / "vectors" / "alice"
+        self.day_dir = Path(self.data_dir) / "users" / "alice" / DAY.isoformat()
+
+    def top_food(self, query: str) -> str:
+        return self.store.search_food_entries("alice", query, top_k=1)[0]["food_name"]
+
+    def assert_aligned(self):
+        """Every stored row sits at the index of its own metadata record"""
+        vectors = self.store._load_vectors(self.vector_dir)
+        metadata = _read_jsonl(self.vector_dir / METADATA_FILENAME)
+        self.assertEqual(len(vectors), len(metadata))
+        for row, record in zip(vectors, metadata):
+            self.assertEqual(int(np.argmax(row)), FOODS.index(record["food_name"]))
+
+    def test_converts_legacy_store(self):
+        self.vector_dir.mkdir(parents=True)
+        self.day_dir.mkdir(parents=True)
+        # Legacy rows were stored unnormalized
+        legacy_vectors = [np.multiply(_food_vector(food), 3.0).tolist() for food in ("apple", "rice")]
+        with open(self.vector_dir / LEGACY_VECTORS_FILENAME, "wb") as f:
+            pickle.dump(legacy_vectors, f)
+        legacy_metadata = [
+            {"entry_id": f"old_{food}", "date": DAY.isoformat(), "food_name": food} for food in ("apple", "rice")
+        ]
+        (self.vector_dir / LEGACY_METADATA_FILENAME).write_bytes(orjson.dumps(legacy_metadata))
+        (self.day_dir / LEGACY_FOOD_LOG_FILENAME).write_bytes(orjson.dumps(legacy_metadata))
+
+        results = self.store.search_food_entries("alice", "rice", top_k=1)
+
+        self.assertEqual(results[0]["entry_id"], "old_rice")
+        self.assertAlmostEqual(results[0]["similarity"], 1.0, places=3)
+        self.assertFalse((self.vector_dir / LEGACY_VECTORS_FILENAME).exists())
+        with open(self.vector_dir / VECTORS_FILENAME, "rb") as f:
+            magic, dim, flags = VECTORS_HEADER.unpack(f.read(VECTORS_HEADER.size))
+        self.assertEqual((magic, dim, flags & VECTORS_FLAG_NORMALIZED), (VECTORS_MAGIC, EMBEDDING_DIM, 1))
+
+        # The first write moves the legacy metadata to JSON Lines, keeping the old rows in place
+        self.store.store_food_entry("alice", {"food_name": "banana"}, DAY)
+
+        self.assertFalse((self.vector_dir / LEGACY_METADATA_FILENAME).exists())
+        self.assert_aligned()
+        self.assertEqual([self.top_food(food) for food in ("apple", "rice", "banana")], ["apple", "rice", "banana"])
+        entries = self.store.get_food_entries_by_date_range("alice", DAY, DAY)
+        self.assertEqual([entry["food_name"] for entry in entries], ["apple", "rice", "banana"])
+
+    def test_append_then_search_keeps_rows_and_metadata_aligned(self):
+        self.store.store_food_entries_bulk("alice", [{"food_name": "apple"}, {"food_name": "rice"}], DAY)
+        self.assertEqual(self.top_food("rice"), "rice")
+
+        self.store.store_food_entry("alice", {"food_name": "banana"}, DAY)
+        self.store.store_food_entry("alice", {"food_name": "salmon"}, date(2025, 3, 6))
+
+        self.assert_aligned()
+        self.assertEqual([self.top_food(food) for food in FOODS], list(FOODS))
+        in_range = self.store.search_food_entries("alice", "salmon", date_range=(DAY, DAY))
+        self.assertNotIn("salmon", [result["food_name"] for result in in_range])
+
+    def test_delete_then_search(self):
+        entry_ids = self.store.store_food_entries_bulk(
+            "alice", [{"food_name": food} for food in ("apple", "rice", "banana")], DAY
+        )
+
+        self.assertTrue(self.store.delete_food_entry("alice", entry_ids[1]))
+
+        self.assert_aligned()
+        results = self.store.search_food_entries("alice", "rice")
+        self.assertNotIn(entry_ids[1], [result["entry_id"] for result in results])
+        self.assertEqual([self.top_food(food) for food in ("apple", "banana")], ["apple", "banana"])
+        entries = self.store.get_food_entries_by_date_range("alice", DAY, DAY)
+        self.assertEqual([entry["food_name"] for entry in entries], ["apple", "banana"])
+        self.assertFalse(self.store.delete_food_entry("alice", entry_ids[1]))
+
+    def test_delete_for_unknown_user_creates_nothing(self):
+        self.assertFalse(self.store.delete_food_entry("nobody", "nobody_20250305_x"))
+        self.assertFalse((Path(self.data_dir) / "vectors" / "nobody").exists())
+
+    def test_partial_last_line_is_dropped(self):
+        self.store.store_food_entries_bulk("alice", [{"food_name": "apple"}, {"food_name": "rice"}], DAY)
+        # Interrupted appends leave a record without its closing newline
+        with open(self.vector_dir / METADATA_FILENAME, "ab") as f:
+            f.write(b'{"entry_id": "cut", "date": "2025-')
+        with open(self.day_dir / FOOD_LOG_FILENAME, "ab") as f:
+            f.write(b'{"entry_id": "cut", "food_na')
+
+        results = self.store.search_food_entries("alice", "rice")
+
+        self.assertEqual([result["food_name"] for result in results][0], "rice")
+        self.assertNotIn("cut", [result["entry_id"] for result in results])
+        entries = self.store.get_food_entries_by_date_range("alice", DAY, DAY)
+        self.assertEqual([entry["food_name"] for entry in entries], ["apple", "rice"])
+
+
+if __name__ == "__main__":
+    unittest.main()